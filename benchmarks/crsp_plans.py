@@ -0,0 +1,120 @@
+"""Compares PostgreSQL plans for the old and new CRSPQuery join predicates.
+
+The old query joins sedelist on extract(year/month) and groups the vweight
+window by extract('year', fdate) through the PL/pgSQL fiscal_year; the new
+one uses month ranges on dlstdt and the inlinable SQL fiscal_year.
+
+    python benchmarks/crsp_plans.py postgresql://user@localhost/wrds --analyze
+"""
+import argparse
+from timeit import default_timer
+
+import sqlalchemy as sa
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import expression
+from sqlalchemy.types import Date
+
+import wrds
+from wrds import sql
+
+LEGACY_FISCAL_YEAR = """
+CREATE OR REPLACE FUNCTION fiscal_year_plpgsql(d date, m int, last boolean)
+    RETURNS date
+    LANGUAGE plpgsql
+AS
+$$
+    DECLARE
+        year int;
+        month int;
+        new_date date;
+    BEGIN
+        year := EXTRACT(YEAR FROM d);
+        month := EXTRACT(MONTH FROM d);
+        IF month > m THEN
+            year := year+1;
+        END IF;
+        month := 1+((month - m + 11)::int % 12);
+        new_date := format('%s-%s-%s', year, month, 1)::date;
+        IF last = TRUE THEN
+            new_date := (date_trunc('MONTH', new_date) + INTERVAL '1 MONTH - 1 day')::date;
+        END IF;
+        RETURN new_date;
+    END;
+$$;
+"""
+
+class legacy_fiscal_year(expression.FunctionElement):
+    type = Date()
+    name = 'fiscal_year_plpgsql'
+
+@compiles(legacy_fiscal_year, 'postgresql')
+def pg_legacy_fiscal_year(element, compiler, **kw):
+    return "fiscal_year_plpgsql({0})".format(compiler.process(element.clauses))
+
+def legacy_query(q):
+    """CRSPQuery.query as built with the extract() join predicates."""
+    args = dict(q._args)
+    q._args.update(delist=False, vwm=None)
+    try:
+        query = q._build(args['start_date'], args['end_date'])
+    finally:
+        q._args = args
+
+    extract = sa.func.extract
+    a = query.alias('a'); b = q.tables['sedelist'].alias('b')
+    query = sa.select([a, ((1+a.c.ret)*(1+sa.func.coalesce(b.c.dlret, 0))-1)
+                       .label('ret_adj')])\
+        .select_from(sa.join(a, b, sa.and_(
+            a.c.permno == b.c.permno,
+            extract('year', a.c.date) == extract('year', b.c.dlstdt),
+            extract('month', a.c.date) == extract('month', b.c.dlstdt)),
+            isouter=True))
+
+    vwm = args['vwm']
+    a = query.alias('a')
+    b = sa.select([legacy_fiscal_year(a.c.date, vwm, True).label('fdate'), a])\
+        .alias('b')
+    c = sa.select([legacy_fiscal_year(a.c.date, vwm, True).label('fdate'),
+                   a.c.date, a.c.permno, a.c.me])\
+        .where(extract('month', a.c.date) == vwm).alias('c')
+    return sa.select([b, (c.c.me*sa.func.exp(
+            sa.func.sum(sa.func.ln(1+sa.func.coalesce(b.c.ret, 0)))
+            .over(partition_by=[b.c.permno, extract('year', b.c.fdate)],
+                  order_by=[b.c.fdate]))).label('vweight')])\
+        .select_from(sa.join(b, c, sa.and_(
+            b.c.permno == c.c.permno,
+            extract('year', b.c.fdate) == extract('year', c.c.fdate)+1),
+            isouter=True))
+
+def explain(engine, query, analyze=False):
+    compiled = query.compile(dialect=engine.dialect)
+    prefix = 'EXPLAIN (ANALYZE, BUFFERS)' if analyze else 'EXPLAIN'
+    start = default_timer()
+    rows = engine.execute(sa.text('{0} {1}'.format(prefix, compiled)),
+                          compiled.params).fetchall()
+    return '\n'.join(row[0] for row in rows), default_timer() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url')
+    parser.add_argument('--vwm', type=int, default=6)
+    parser.add_argument('--start-date', default='2000-01-01')
+    parser.add_argument('--end-date', default='2010-12-31')
+    parser.add_argument('--analyze', action='store_true',
+                        help='run the queries (EXPLAIN ANALYZE)')
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.url)
+    sql.create_functions(engine)
+    engine.execute(sa.text(LEGACY_FISCAL_YEAR))
+
+    q = wrds.CRSPQuery(engine=engine, vwm=args.vwm,
+                       start_date=args.start_date, end_date=args.end_date)
+    for label, query in (('old', legacy_query(q)), ('new', q.query)):
+        plan, seconds = explain(engine, query, args.analyze)
+        print('==== {0} ({1:.2f}s) ===='.format(label, seconds))
+        print(plan)
+        print('')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Measures `import wrds` time in fresh interpreters.
+
+Each case runs `--repeat` times in a new process and reports the median
+seconds spent in its statements (interpreter startup excluded) and which
+heavy dependencies it loaded. `eager` imports everything the package
+exports, as `import wrds` did before submodules were loaded lazily.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --json new.json --baseline old.json
+
+With --baseline, cases more than `tolerance` slower than the saved run, or
+`import wrds` loading any heavy dependency, are reported and the exit
+status is 1.
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+CASES = [('import', 'import wrds'),
+         ('comp', 'import wrds; wrds.comp.GPA'),
+         ('query', 'import wrds; wrds.CRSPQuery'),
+         ('eager', 'from wrds import *')]
+
+HEAVY = ['numpy', 'pandas', 'sqlalchemy', 'multiprocessing',
+         'pandas_datareader', 'statsmodels']
+
+SCRIPT = """
+import sys
+from timeit import default_timer
+start = default_timer()
+{0}
+seconds = default_timer() - start
+heavy = [m for m in {1!r} if m in sys.modules]
+print(repr((seconds, heavy)))
+"""
+
+def measure(statement, repeat):
+    """Median import seconds of `statement` and the heavy modules it loads."""
+    times = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c',
+                                       SCRIPT.format(statement, HEAVY)])
+        seconds, heavy = eval(out.decode().strip().splitlines()[-1])
+        times.append(seconds)
+    times.sort()
+    return {'seconds': times[len(times)//2], 'heavy': heavy}
+
+def compare(results, baseline, tolerance):
+    """Cases that regressed by more than `tolerance` (a fraction)."""
+    regressions = []
+    for name, values in sorted(results.items()):
+        old = baseline.get(name, {}).get('seconds')
+        if old and (values['seconds'] - old)/old > tolerance:
+            regressions.append((name, old, values['seconds']))
+    return regressions
+
+def report(results):
+    print('{0:<8}{1:>10}  {2}'.format('', 'seconds', 'heavy modules'))
+    for name, _ in CASES:
+        values = results[name]
+        print('{0:<8}{1:>10.4f}  {2}'.format(name, values['seconds'],
+                                             ', '.join(values['heavy'])))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=11)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = dict((name, measure(statement, args.repeat))
+                   for name, statement in CASES)
+    report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failed = False
+        for name, old, new in compare(results, baseline, args.tolerance):
+            print('REGRESSION {0}: {1:.4f}s -> {2:.4f}s'.format(name, old, new))
+            failed = True
+        if results['import']['heavy']:
+            print('REGRESSION import: loads {0}'.format(
+                ', '.join(results['import']['heavy'])))
+            failed = True
+        if failed:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Checks that the query classes return the same data on two databases.
+
+Typically the reference is the PostgreSQL WRDS server and the candidate an
+in-process engine loaded with Parquet extracts of the same tables:
+
+    python benchmarks/parity.py postgresql://user@localhost/wrds \\
+        duckdb:///wrds.duckdb --parquet /data/wrds_extracts
+
+Each query runs on both engines; the frames are compared after sorting rows
+and columns, with a relative tolerance for floats. The exit status is 1 if
+any query differs.
+"""
+import sys
+import logging
+import argparse
+
+import wrds
+from wrds.parity import QUERIES, run
+from wrds.sql import create_functions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('reference', help='reference database URL')
+    parser.add_argument('candidate', help='database URL to check')
+    parser.add_argument('--parquet', help='attach Parquet extracts from this '
+                        'directory to the candidate first')
+    parser.add_argument('--only', nargs='*', help='query names to run')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    reference = wrds.db.get_engine(args.reference)
+    candidate = wrds.db.get_engine(args.candidate)
+    if args.parquet:
+        wrds.db.attach_parquet(candidate, args.parquet)
+    for engine in (reference, candidate):
+        create_functions(engine)
+
+    queries = [q for q in QUERIES if not args.only or q[0] in args.only]
+    sys.exit(1 if run(reference, candidate, queries) else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Benchmarks the query classes and characteristic functions on synthetic data.
+
+Builds (or reuses) a synthetic WRDS database with wrds.synthetic and reports
+per subsystem:
+
+    latency     seconds until the first row arrives
+    fetch       rows/s fetching the result as tuples
+    to_df       seconds building the DataFrame (read_frame minus fetch)
+    peak_mb     peak resident memory growth during read_frame
+    compute     seconds for the comp/crsp functions on the result
+
+    python benchmarks/suite.py sqlite:///wrds_bench.db --firms 500 --build
+    python benchmarks/suite.py sqlite:///wrds_bench.db --json new.json \\
+        --baseline old.json --tolerance 0.25
+
+With --baseline, timings more than `tolerance` slower (or peak memory that
+much larger) than the saved run are reported and the exit status is 1.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+from timeit import default_timer
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import wrds
+from wrds import comp, crsp, synthetic
+from wrds.sql import create_functions
+
+# larger is better for these metrics
+HIGHER_IS_BETTER = ('fetch',)
+
+def timed(f, *args, **kwargs):
+    start = default_timer()
+    result = f(*args, **kwargs)
+    return result, default_timer() - start
+
+def rss():
+    """Resident set size of this process in bytes (None if unknown)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return None
+
+def peak(f, *args, **kwargs):
+    """Result, seconds and peak RSS growth (MB) of f(*args, **kwargs).
+
+    RSS is sampled every 10ms on a thread, which unlike tracemalloc does not
+    slow down the code being timed.
+    """
+    start = rss()
+    if start is None:
+        result, seconds = timed(f, *args, **kwargs)
+        return result, seconds, float('nan')
+
+    high = [start]
+    done = threading.Event()
+    def sample():
+        while not done.wait(0.01):
+            high[0] = max(high[0], rss())
+    sampler = threading.Thread(target=sample)
+    sampler.daemon = True
+    sampler.start()
+    try:
+        result, seconds = timed(f, *args, **kwargs)
+    finally:
+        done.set()
+        sampler.join()
+    high[0] = max(high[0], rss())
+    return result, seconds, (high[0] - start)/2.**20
+
+def bench_query(engine, query):
+    """Latency, fetch rate, DataFrame build time and peak memory."""
+    res = engine.execute(query.query)
+    start = default_timer()
+    first = res.fetchmany(1)
+    latency = default_timer() - start
+    rows, fetch = timed(res.fetchall)
+    nrows = len(first) + len(rows)
+    res.close()
+
+    df, seconds, peak_mb = peak(query.read_frame)
+    return df, {'rows': nrows, 'latency': latency,
+                'fetch': nrows/max(fetch, 1e-9),
+                'to_df': max(seconds - latency - fetch, 0.),
+                'peak_mb': peak_mb}
+
+def crsp_msf(engine):
+    q = wrds.CRSPQuery(engine=engine, vwm=6, start_date='1990-01-01')
+    msf, result = bench_query(engine, q)
+    _, result['compute'] = timed(crsp.momentum, msf['ret_adj'].astype(float))
+    return result
+
+def funda(engine):
+    q = wrds.FUNDAQuery(engine=engine, nsi=True, tac=True, noa=True, gp=True,
+                        ag=True, ia=True, roa=True, oscore=True)
+    df, result = bench_query(engine, q)
+    _, result['compute'] = timed(comp.compute_anomalies, df, period=12)
+    return result
+
+def funda_sql(engine):
+    q = wrds.FUNDAQuery(engine=engine, nsi=True, tac=True, noa=True, gp=True,
+                        ag=True, ia=True, roa=True, oscore=True,
+                        compute='sql')
+    return bench_query(engine, q)[1]
+
+def fundq(engine):
+    return bench_query(engine, wrds.FUNDQQuery(engine=engine))[1]
+
+def crsp_dsf_monthly(engine):
+    q = wrds.CRSPQuery(engine=engine, freq='dsf', vwm=None,
+                       start_date='1990-01-01')
+    months, seconds, peak_mb = peak(crsp.monthly_dsf, q, chunksize='64MB')
+    return {'rows': len(months), 'compute': seconds, 'peak_mb': peak_mb}
+
+BENCHMARKS = [crsp_msf, funda, funda_sql, fundq, crsp_dsf_monthly]
+
+def run(engine, daily=True):
+    results = {}
+    for bench in BENCHMARKS:
+        if bench is crsp_dsf_monthly and not daily:
+            continue
+        try:
+            results[bench.__name__] = bench(engine)
+        except Exception:
+            # report the others; a failure shows up as a missing row
+            logging.exception('Benchmark {0} failed.'.format(bench.__name__))
+    return results
+
+def compare(results, baseline, tolerance):
+    """Metrics that regressed by more than `tolerance` (a fraction)."""
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        for metric, value in sorted(metrics.items()):
+            old = baseline.get(name, {}).get(metric)
+            if metric == 'rows' or not old or value != value:
+                continue
+            change = (old - value)/old if metric in HIGHER_IS_BETTER \
+                else (value - old)/old
+            if change > tolerance:
+                regressions.append((name, metric, old, value, change))
+    return regressions
+
+def report(results):
+    metrics = ['rows', 'latency', 'fetch', 'to_df', 'peak_mb', 'compute']
+    print('{0:<18}'.format('') + ''.join('{0:>12}'.format(m) for m in metrics))
+    for name, values in sorted(results.items()):
+        cells = []
+        for m in metrics:
+            v = values.get(m)
+            cells.append('{0:>12}'.format('-' if v is None else
+                                          '{0:,.0f}'.format(v)
+                                          if m in ('rows', 'fetch') else
+                                          '{0:.3f}'.format(v)))
+        print('{0:<18}'.format(name) + ''.join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url', help='SQLAlchemy database URL')
+    parser.add_argument('--build', action='store_true',
+                        help='(re)build the synthetic tables first')
+    parser.add_argument('--firms', type=int, default=500)
+    parser.add_argument('--no-daily', dest='daily', action='store_false')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    engine = wrds.db.get_engine(args.url)
+    if args.build:
+        synthetic.generate(engine, args.firms, daily=args.daily)
+    create_functions(engine)
+
+    results = run(engine, args.daily)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, old, new, change in regressions:
+            print('REGRESSION {0}.{1}: {2:.4g} -> {3:.4g} ({4:+.0%})'.format(
+                name, metric, old, new, change))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
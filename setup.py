@@ -18,6 +18,8 @@ setup(
     author_email='eddyhu@gmail.com',
     packages=find_packages(exclude=['tests*']),
     install_requires=['sqlalchemy', 'pandas', 'numpy'],
+    extras_require={'cache': ['pyarrow'],
+                    'duckdb': ['duckdb', 'duckdb-engine', 'pyarrow']},
     include_package_data=True,
     classifiers=[
         'Development Status :: 5 - Production/Stable',
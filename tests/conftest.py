@@ -0,0 +1,28 @@
+import shutil
+
+import pytest
+
+import wrds
+from wrds import synthetic
+
+@pytest.fixture(scope='session')
+def synthetic_args():
+    """wrds.synthetic.generate arguments shared by the test databases."""
+    # small enough to build in seconds, large enough for entries, exits,
+    # delistings and multiple link intervals
+    return dict(firms=120, start='2003-01-01', end='2009-12-31')
+
+@pytest.fixture(scope='session')
+def sqlite_engine(tmp_path_factory, synthetic_args):
+    """sqlite database with the synthetic WRDS tables."""
+    path = tmp_path_factory.mktemp('wrds').joinpath('synthetic.db')
+    engine = wrds.db.get_engine('sqlite:///{0}'.format(path))
+    synthetic.generate(engine, **synthetic_args)
+    return engine
+
+@pytest.fixture
+def scratch_engine(sqlite_engine, tmp_path):
+    """A copy of the synthetic database that tests may modify."""
+    path = tmp_path.joinpath('copy.db')
+    shutil.copy(sqlite_engine.url.database, str(path))
+    return wrds.db.get_engine('sqlite:///{0}'.format(path))
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+from timeit import default_timer
+
+import pytest
+import sqlalchemy as sa
+
+import wrds
+from wrds import aio
+
+def _slow_query(sqlite_engine):
+    """CRSPQuery whose statement runs for hours: msf x msf x msf."""
+    q = wrds.CRSPQuery(engine=sqlite_engine)
+    msf = q.tables['msf']
+    a, b, c = msf.alias('a'), msf.alias('b'), msf.alias('c')
+    q.query = sa.select([sa.func.count()]).select_from(
+        a.join(b, sa.true()).join(c, sa.true()))
+    return q
+
+def test_timeout_cancels_query(sqlite_engine, caplog):
+    q = _slow_query(sqlite_engine)
+    start = default_timer()
+    with caplog.at_level(logging.INFO), pytest.raises(asyncio.TimeoutError):
+        asyncio.run(q.read_frame_async(timeout=0.5))
+    assert '(1 statements interrupted)' in caplog.text
+    # the worker was interrupted rather than left to finish the statement
+    assert default_timer() - start < aio.GRACE
+    assert q._cancel is None
+
+    # the connection went back to the pool in working order
+    df = wrds.CRSPQuery(engine=sqlite_engine, limit=5).read_frame()
+    assert len(df) == 5
+
+def test_read_frames(sqlite_engine):
+    crsp, funda = aio.read_frames(wrds.CRSPQuery(engine=sqlite_engine,
+                                                 limit=10),
+                                  (wrds.FUNDAQuery(engine=sqlite_engine),
+                                   {'chunksize': None}))
+    assert len(crsp) == 10
+    assert len(funda) == len(wrds.FUNDAQuery(engine=sqlite_engine)
+                             .read_frame())
+
+def test_gather_cancels_the_other_reads(sqlite_engine):
+    slow = _slow_query(sqlite_engine)
+    failing = wrds.FUNDAQuery(engine=sqlite_engine)
+    failing.query = sa.select([sa.literal_column('no_such_column')])
+
+    start = default_timer()
+    with pytest.raises(sa.exc.OperationalError):
+        aio.read_frames(slow, failing)
+    assert default_timer() - start < aio.GRACE
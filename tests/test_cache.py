@@ -0,0 +1,71 @@
+import logging
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import wrds
+from wrds import cache, db
+
+@pytest.fixture
+def engine(scratch_engine):
+    return scratch_engine
+
+@pytest.fixture
+def result_cache(tmp_path):
+    return cache.ResultCache(str(tmp_path.joinpath('cache')))
+
+def _read(engine, result_cache):
+    return wrds.CCMLinkQuery(engine=engine).read_frame(cache=result_cache)
+
+def test_hit(engine, result_cache):
+    first = _read(engine, result_cache)
+    second = _read(engine, result_cache)
+    assert result_cache.hits == 1
+    assert len(second) == len(first)
+
+@pytest.mark.parametrize('statement', [
+    "UPDATE ccmxpf_linktable SET lpermno = lpermno + 1000000",
+    "DELETE FROM ccmxpf_linktable WHERE gvkey = "
+    "(SELECT min(gvkey) FROM ccmxpf_linktable)",
+])
+def test_sqlite_changes_invalidate(engine, result_cache, statement):
+    before = _read(engine, result_cache)
+    engine.execute(statement)
+    after = _read(engine, result_cache)
+    assert result_cache.hits == 0
+    assert result_cache.stale == 1
+    assert not after.equals(before)
+
+def test_in_memory_sqlite_is_not_cached(result_cache):
+    engine = db.get_engine('sqlite://')
+    assert cache.source_state(engine, ['msf']) is None
+
+def test_duckdb_parquet_changes_invalidate(sqlite_engine, tmp_path):
+    pytest.importorskip('duckdb_engine')
+    import pandas as pd
+    directory = tmp_path.joinpath('pq')
+    directory.mkdir()
+    links = pd.read_sql_table('ccmxpf_linktable', sqlite_engine)
+    links.to_parquet(str(directory.joinpath('ccmxpf_linktable.parquet')))
+    engine = db.get_engine('duckdb:///:memory:')
+    db.attach_parquet(engine, str(directory))
+
+    state = cache.source_state(engine, ['ccmxpf_linktable'])
+    assert state is not None
+    assert cache.source_state(engine, ['ccmxpf_linktable']) == state
+    links.iloc[1:].to_parquet(
+        str(directory.joinpath('ccmxpf_linktable.parquet')))
+    assert cache.source_state(engine, ['ccmxpf_linktable']) != state
+
+    engine.execute('CREATE TABLE in_memory AS SELECT 1 AS x')
+    assert cache.source_state(engine, ['in_memory']) is None
+
+def test_failed_put_returns_frame(engine, result_cache, monkeypatch, caplog):
+    def fail(*args, **kwargs):
+        raise IOError('disk full')
+    monkeypatch.setattr(result_cache, 'put', fail)
+    with caplog.at_level(logging.WARNING):
+        df = _read(engine, result_cache)
+    assert len(df)
+    assert 'cannot cache' in caplog.text
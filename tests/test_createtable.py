@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+import wrds
+
+CUTOFF = '2008-06-30'
+
+def _table(engine, name, key):
+    df = pd.read_sql_table(name, engine)
+    return df[sorted(df.columns)].sort_values(list(key)).reset_index(drop=True)
+
+def _last_build(engine, name):
+    with engine.connect() as conn:
+        return wrds.last_build(conn, name)
+
+def test_full_build(scratch_engine):
+    q = wrds.CRSPQuery(engine=scratch_engine, vwm=6)
+    q.create_table('crsp_m')
+    # a second full build replaces the table
+    q.create_table('crsp_m')
+    table = _table(scratch_engine, 'crsp_m', q._key)
+    assert len(table) == len(q.read_frame())
+    assert _last_build(scratch_engine, 'crsp_m') == \
+        pd.Timestamp(table['date'].max()).date()
+
+@pytest.mark.parametrize('cls,kwargs,raw,date', [
+    (wrds.CRSPQuery, dict(vwm=6), 'msf', 'date'),
+    (wrds.FUNDAQuery, dict(nsi=True), 'funda', 'datadate'),
+])
+def test_incremental_matches_full(scratch_engine, cls, kwargs, raw, date):
+    # build on the data up to CUTOFF, then add the rest and refresh
+    scratch_engine.execute("CREATE TABLE held AS SELECT * FROM {0} "
+                           "WHERE {1} > '{2}'".format(raw, date, CUTOFF))
+    scratch_engine.execute("DELETE FROM {0} WHERE {1} > '{2}'".format(
+        raw, date, CUTOFF))
+    cls(engine=scratch_engine, **kwargs).create_table('built')
+    assert str(_last_build(scratch_engine, 'built')) <= CUTOFF
+
+    scratch_engine.execute("INSERT INTO {0} SELECT * FROM held".format(raw))
+    q = cls(engine=scratch_engine, **kwargs)
+    assert q.create_table('built', mode='incremental') > 0
+    q.create_table('rebuilt')
+
+    built = _table(scratch_engine, 'built', q._key)
+    rebuilt = _table(scratch_engine, 'rebuilt', q._key)
+    assert str(built[date].max()) > CUTOFF
+    pd.testing.assert_frame_equal(built, rebuilt)
+
+def test_indexes(scratch_engine, caplog):
+    q = wrds.FUNDAQuery(engine=scratch_engine)
+    q.create_table('funda_m', cluster=True)
+    indexes = sa.inspect(scratch_engine).get_indexes('funda_m')
+    assert sorted(tuple(ix['column_names']) for ix in indexes) == \
+        sorted(q._indexes)
+    assert 'CLUSTER is only supported on PostgreSQL.' in caplog.text
+    # ANALYZE gathered statistics for the new indexes
+    assert scratch_engine.execute("SELECT count(*) FROM sqlite_stat1 "
+                                  "WHERE tbl = 'funda_m'").scalar() > 0
+
+    # columns missing from the query are skipped; [] creates none
+    q.create_table('funda_m', indexes=[('gvkey',), ('permno', 'date')])
+    indexes = sa.inspect(scratch_engine).get_indexes('funda_m')
+    assert [ix['column_names'] for ix in indexes] == [['gvkey']]
+    q.create_table('funda_m', indexes=[])
+    assert sa.inspect(scratch_engine).get_indexes('funda_m') == []
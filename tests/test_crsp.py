@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import wrds
+from wrds import crsp
+
+@pytest.fixture(scope='module')
+def dsf(sqlite_engine):
+    return wrds.CRSPQuery(engine=sqlite_engine, freq='dsf',
+                          vwm=None).read_frame().sort_index()
+
+def _reference_monthly(dsf):
+    """Per permno-month stats from one groupby over all daily rows."""
+    dates = dsf.index.get_level_values('date') + pd.offsets.MonthEnd(0)
+    keys = [dsf.index.get_level_values('permno'), dates]
+    ret = dsf['ret'].astype(float)
+    g = ret.groupby(keys)
+    out = pd.DataFrame({'ret': (1 + ret).groupby(keys).prod(min_count=1) - 1,
+                        'rvol': g.std(),
+                        'ndays': g.size(),
+                        'maxret': g.max()})
+    out.index.names = ['permno', 'date']
+    return out
+
+def _compare(result, expected):
+    result = result.sort_index()
+    assert list(result.index) == list(expected.index)
+    for col in ('ret', 'rvol', 'maxret'):
+        np.testing.assert_allclose(result[col].values.astype(float),
+                                   expected[col].values, rtol=1e-9,
+                                   err_msg=col)
+    assert (result['ndays'].values == expected['ndays'].values).all()
+
+def test_daily_to_monthly_matches_groupby(dsf):
+    # chunk boundaries fall inside months
+    chunks = [dsf.iloc[i:i + 997] for i in range(0, len(dsf), 997)]
+    result = pd.concat(list(crsp.daily_to_monthly(chunks)))
+    _compare(result, _reference_monthly(dsf))
+
+def test_daily_to_monthly_wiped_out():
+    index = pd.MultiIndex.from_tuples(
+        [(1, pd.Timestamp('2005-01-03')), (1, pd.Timestamp('2005-01-04')),
+         (1, pd.Timestamp('2005-01-05'))], names=['permno', 'date'])
+    df = pd.DataFrame({'ret': [0.1, -1., 0.5]}, index=index)
+    result = pd.concat(list(crsp.daily_to_monthly([df.iloc[:2],
+                                                   df.iloc[2:]])))
+    assert result['ret'].tolist() == [-1.]
+    assert result['ndays'].tolist() == [3]
+
+def test_monthly_dsf_matches_groupby(sqlite_engine, dsf):
+    q = wrds.CRSPQuery(engine=sqlite_engine, freq='dsf', vwm=None)
+    _compare(crsp.monthly_dsf(q, chunksize=5000), _reference_monthly(dsf))
+    # the chunked read does not leave its options on the query
+    df = q.read_frame()
+    assert isinstance(df, pd.DataFrame)
+    assert len(df) == len(dsf)
+
+@pytest.fixture(scope='module')
+def daily(dsf):
+    """Four firms over the first 80 trading days, some returns missing."""
+    dates = dsf.index.get_level_values('date')
+    ret = dsf.loc[dates < np.sort(dates.unique())[80], 'ret'].astype(float)
+    permnos = ret.index.get_level_values('permno')
+    listed = ret.groupby(permnos).size()
+    ret = ret[np.isin(permnos, listed[listed > 40].index[:4])]
+    ret[np.random.RandomState(0).rand(len(ret)) < 0.05] = np.nan
+    return ret
+
+def _reference_window(ret, days, min_obs, stat):
+    """stat(window frame) over each firm's trailing `days` rows."""
+    mkt = ret.groupby(level='date').mean().rename('mkt')
+    df = pd.DataFrame({'ret': ret.values,
+                       'mkt': mkt.reindex(ret.index.get_level_values('date'))
+                       .values}, index=ret.index)
+    out = pd.Series(np.nan, index=ret.index)
+    permnos = ret.index.get_level_values('permno')
+    for permno in np.unique(permnos):
+        rows = np.flatnonzero(permnos == permno)
+        for k, i in enumerate(rows):
+            window = df.iloc[rows[max(0, k - days + 1):k + 1]].dropna()
+            if len(window) >= min_obs:
+                out.iloc[i] = stat(window)
+    return out
+
+def test_vol_matches_rmse_per_window(daily):
+    result = crsp.VOL(daily, days=20, min_obs=15)
+    expected = _reference_window(
+        daily, 20, 15, lambda w: crsp.rmse(w, 'ret', ['mkt'])['ivol'])
+    assert result.notnull().any() and result.isnull().any()
+    np.testing.assert_allclose(result.values, expected.values, rtol=1e-8)
+
+def test_bab_matches_lstsq_per_window(daily):
+    def beta(w):
+        Z = np.column_stack([np.ones(len(w)), w['mkt'].values])
+        return np.linalg.lstsq(Z, w['ret'].values, rcond=None)[0][1]
+
+    result = crsp.BAB(daily, days=30, min_obs=20, shrink=0.6)
+    expected = 0.6*_reference_window(daily, 30, 20, beta) + 0.4
+    assert result.notnull().any() and result.isnull().any()
+    np.testing.assert_allclose(result.values, expected.values, rtol=1e-8)
+
+def _monthly(seed=0, firms=5, months=30, gaps=True):
+    """Monthly (permno, date) returns, optionally with missing months."""
+    rng = np.random.RandomState(seed)
+    dates = pd.date_range('2001-01-31', periods=months, freq='M')
+    rows = [(permno, d) for permno in range(10001, 10001 + firms)
+            for d in dates if not (gaps and rng.rand() < 0.1)]
+    index = pd.MultiIndex.from_tuples(rows, names=['permno', 'date'])
+    return pd.Series(rng.randn(len(index))*0.1, index=index, name='ret')
+
+def _reference_mom(ret, n, skip, min_obs):
+    """Product of 1+ret over each row's calendar months t-skip-n+1..t-skip."""
+    out = pd.Series(np.nan, index=ret.index)
+    for (permno, date), i in zip(ret.index, range(len(ret))):
+        lo = date - pd.offsets.MonthEnd(skip + n - 1)
+        hi = date - pd.offsets.MonthEnd(skip) if skip else date
+        window = ret.loc[permno]
+        window = window[(window.index >= lo) & (window.index <= hi)].dropna()
+        if len(window) >= min_obs:
+            out.iloc[i] = np.prod(1 + window.values) - 1
+    return out
+
+def test_mom_matches_rolling_product():
+    ret = _monthly(gaps=False)
+    for n, skip in ((11, 0), (5, 1)):
+        expected = ret.groupby(level='permno').transform(
+            lambda x: (1 + x).rolling(n).apply(np.prod, raw=True)
+            .shift(skip) - 1)
+        np.testing.assert_allclose(crsp.MOM(ret, n, skip).values,
+                                   expected.values, rtol=1e-9)
+
+@pytest.mark.parametrize('min_obs', [None, 3])
+def test_mom_does_not_bridge_missing_months(min_obs):
+    ret = _monthly()
+    ret.iloc[7] = np.nan
+    result = crsp.momentum(ret, ((5, 0), (5, 1)), min_obs=min_obs)
+    for (n, skip), col in zip(((5, 0), (5, 1)), result.columns):
+        expected = _reference_mom(ret, n, skip, min_obs or n)
+        np.testing.assert_allclose(result[col].values, expected.values,
+                                   rtol=1e-9, err_msg=col)
+        pd.testing.assert_series_equal(
+            crsp.MOM(ret, n, skip, min_obs), result[col])
+    # with period=None windows count rows and do reach across gaps
+    rows = crsp.MOM(ret, 5, period=None, min_obs=3)
+    assert (rows.notnull() & result['mom_6'].isnull()).any()
+
+def test_mom_wiped_out():
+    ret = _monthly(firms=1, months=8, gaps=False)
+    ret.iloc[3] = -1.
+    mom = crsp.MOM(ret, 3)
+    # every window containing month 3 loses everything, later ones do not
+    assert mom.iloc[2] > -1
+    assert (mom.iloc[3:6] == -1.).all()
+    assert mom.iloc[6:].gt(-1).all()
+    assert np.isfinite(mom.dropna().values).all()
+
+def test_cei_is_me_growth_less_returns():
+    ret = _monthly(gaps=False)
+    me = np.exp(ret.groupby(level='permno').cumsum()) * 100
+    ret.iloc[4] = np.nan
+    cei = crsp.CEI(ret, me, n=6)
+    by = ret.groupby(level='permno')
+    growth = np.log(me) - np.log(me).groupby(level='permno').shift(6)
+    returns = by.transform(lambda x: np.log1p(x.fillna(0)).rolling(6).sum()
+                           .shift(1))
+    assert cei.notnull().any()
+    np.testing.assert_allclose(cei.values, (growth - returns).values,
+                               rtol=1e-9, atol=1e-12)
@@ -0,0 +1,31 @@
+import sqlite3
+import threading
+import time
+
+from wrds import db
+
+def _pool(connect_delay):
+    def creator():
+        time.sleep(connect_delay)
+        return sqlite3.connect(':memory:', check_same_thread=False)
+    pool = db._TimedQueuePool(creator, pool_size=1, max_overflow=0,
+                              timeout=5)
+    pool.stats = db.PoolStats()
+    return pool
+
+def test_connect_time_is_not_wait_time():
+    pool = _pool(0.2)
+    pool.connect().close()
+    stats = pool.stats
+    assert stats.connect_time >= 0.2
+    assert stats.wait_time < 0.1
+
+def test_wait_time_measures_contention():
+    pool = _pool(0.)
+    conn = pool.connect()
+    release = threading.Timer(0.3, conn.close)
+    release.start()
+    pool.connect().close()
+    release.join()
+    assert 0.25 <= pool.stats.max_wait_time < 1
+    assert pool.stats.connect_time < 0.1
@@ -0,0 +1,37 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+import wrds
+from wrds import util
+
+def test_integer_dtype_does_not_depend_on_nulls():
+    dtypes = {'permno': 'int32', 'exchcd': 'Int8'}
+    full = util.apply_dtypes(pd.DataFrame({'permno': [1., 2.],
+                                           'exchcd': [1, 3]}), dtypes)
+    holes = util.apply_dtypes(pd.DataFrame({'permno': [3., np.nan],
+                                            'exchcd': [None, 2]}), dtypes)
+    for df in (full, holes):
+        assert str(df['permno'].dtype) == 'Int32'
+        assert str(df['exchcd'].dtype) == 'Int8'
+    df = pd.concat([full, holes])
+    assert str(df['permno'].dtype) == 'Int32'
+    assert df['permno'].isnull().sum() == 1
+
+def test_chunks_share_dtypes(sqlite_engine):
+    q = wrds.CRSPQuery(engine=sqlite_engine, vwm=6)
+    chunks = list(q.read_frame(chunksize=500))
+    assert len(chunks) > 1
+    # categories differ by chunk; the dtype names do not
+    dtypes = chunks[0].dtypes.astype(str)
+    for chunk in chunks[1:]:
+        pd.testing.assert_series_equal(chunk.dtypes.astype(str), dtypes)
+
+def test_memory_is_measured_without_info_logging(sqlite_engine):
+    assert not logging.getLogger().isEnabledFor(logging.INFO)
+    q = wrds.CRSPQuery(engine=sqlite_engine, vwm=6)
+    q.read_frame()
+    assert q.memory['before'] > q.memory['after'] > 0
+    q.read_frame(dtypes=False)
+    assert q.memory == {'before': 0, 'after': 0}
@@ -0,0 +1,146 @@
+import json
+
+import sqlalchemy as sa
+
+import wrds
+from wrds import explain
+
+# EXPLAIN (FORMAT JSON, ANALYZE) output of a slow msf/msenames join
+PG_PLAN = json.loads('''
+[{"Plan": {"Node Type": "Sort", "Total Cost": 5000.0, "Plan Rows": 2000,
+           "Actual Rows": 2000, "Actual Loops": 1,
+           "Actual Total Time": 1500.0, "Sort Method": "external merge",
+           "Sort Space Type": "Disk", "Sort Space Used": 20480,
+           "Plans": [
+  {"Node Type": "Nested Loop", "Total Cost": 4000.0, "Plan Rows": 10,
+   "Actual Rows": 2000, "Actual Loops": 1, "Actual Total Time": 1400.0,
+   "Plans": [
+     {"Node Type": "Seq Scan", "Relation Name": "msf", "Alias": "a",
+      "Total Cost": 3000.0, "Plan Rows": 2000000, "Actual Rows": 2000000,
+      "Actual Loops": 1, "Actual Total Time": 400.0},
+     {"Node Type": "Index Scan", "Relation Name": "msenames", "Alias": "b",
+      "Total Cost": 0.5, "Plan Rows": 10, "Actual Rows": 10,
+      "Actual Loops": 2000000, "Actual Total Time": 0.001}]}]},
+  "Planning Time": 1.5, "Execution Time": 1500.0}]
+''')
+
+# EXPLAIN QUERY PLAN rows (id, parent, notused, detail), in the old and the
+# new (SQLite 3.36+) wording
+SQLITE_ROWS = [
+    (2, 0, 0, 'SCAN TABLE msf AS a'),
+    (4, 0, 0, 'SEARCH b USING INDEX ix_msenames_permno (permno=?)'),
+    (9, 0, 0, 'SCAN c'),
+    (12, 0, 0, 'USE TEMP B-TREE FOR ORDER BY'),
+]
+
+# EXPLAIN (FORMAT JSON) and EXPLAIN (ANALYZE, FORMAT JSON) on DuckDB
+DUCKDB_PLAN = json.loads('''
+[{"name": "PROJECTION", "extra_info": {}, "children": [
+  {"name": "HASH_JOIN", "extra_info": {"Estimated Cardinality": "2000"},
+   "children": [
+     {"name": "SEQ_SCAN ", "extra_info": {"Table": "msf",
+      "Estimated Cardinality": "2000000"}, "children": []},
+     {"name": "SEQ_SCAN ", "extra_info": {"Table": "msenames",
+      "Estimated Cardinality": "30000"}, "children": []}]}]}]
+''')
+DUCKDB_PROFILE = json.loads('''
+{"latency": 2.5, "system_peak_temp_dir_size": 104857600, "children": [
+  {"operator_type": "EXPLAIN_ANALYZE", "children": [
+    {"operator_type": "ORDER_BY", "operator_name": "ORDER_BY",
+     "operator_cardinality": 2000, "operator_timing": 1.0,
+     "extra_info": {}, "children": [
+       {"operator_type": "TABLE_SCAN", "operator_name": "TABLE_SCAN",
+        "operator_cardinality": 2000000, "operator_timing": 0.5,
+        "extra_info": {"Table": "msf", "Estimated Cardinality": "2000000"},
+        "children": []}]}]}]}
+''')
+
+def _kinds(result):
+    return sorted(p.kind for p in result.problems)
+
+def test_postgres_plan():
+    result = explain._pg_plan(PG_PLAN[0], analyze=True)
+    assert [n.node_type for n in result.nodes()] == \
+        ['Sort', 'Nested Loop', 'Seq Scan', 'Index Scan']
+    scan = result.nodes()[2]
+    assert (scan.table, scan.alias, scan.rows) == ('msf', 'a', 2000000)
+    assert result.root.seconds == 1.5
+    assert result.planning_seconds == 0.0015
+    assert result.execution_seconds == 1.5
+
+    result.problems += explain._check(result, {'msf': 2000000},
+                                      explain.LARGE_ROWS, explain.LOOP_ROWS,
+                                      explain.MISESTIMATE)
+    assert _kinds(result) == ['misestimate', 'nested_loop', 'seq_scan',
+                              'spill']
+    problems = dict((p.kind, p.node) for p in result.problems)
+    assert problems['seq_scan'] is scan
+    # the estimate first goes wrong at the join, not at the sort above it
+    assert problems['misestimate'].node_type == 'Nested Loop'
+    assert problems['spill'] is result.root
+    text = result.text()
+    assert 'Seq Scan on msf a' in text and 'Problems:' in text
+
+def test_postgres_plan_without_analyze():
+    def estimates(node):
+        node = dict((k, v) for k, v in node.items()
+                    if not k.startswith(('Actual', 'Sort Space')))
+        node['Plans'] = [estimates(p) for p in node.get('Plans', [])]
+        return node
+
+    raw = {'Plan': estimates(PG_PLAN[0]['Plan'])}
+    result = explain._pg_plan(raw, analyze=False)
+    assert result.execution_seconds is None and result.root.seconds is None
+    problems = explain._check(result, {}, explain.LARGE_ROWS,
+                              explain.LOOP_ROWS, explain.MISESTIMATE)
+    # 2M estimated outer rows x 10 estimated rows per lookup
+    assert [p.kind for p in problems] == ['nested_loop']
+
+def test_sqlite_plan():
+    result = explain._sqlite_plan(SQLITE_ROWS, {'a': 'msf', 'b': 'msenames',
+                                                'c': 'dse'})
+    scans = [(n.node_type, n.table, n.alias) for n in result.root.children]
+    assert scans == [('SCAN', 'msf', 'a'), ('SEARCH', 'msenames', 'b'),
+                     ('SCAN', 'dse', 'c'),
+                     ('USE TEMP B-TREE FOR ORDER BY', None, None)]
+    problems = explain._check(result, {'msf': 2000000, 'dse': 10000},
+                              explain.LARGE_ROWS, explain.LOOP_ROWS,
+                              explain.MISESTIMATE)
+    assert sorted((p.kind, p.node.table) for p in problems) == \
+        [('nested_loop', 'dse'), ('seq_scan', 'msf')]
+
+def test_duckdb_plans():
+    result = explain._duckdb_plan(DUCKDB_PLAN, analyze=False)
+    assert [n.node_type for n in result.nodes()] == \
+        ['PROJECTION', 'HASH_JOIN', 'SEQ_SCAN', 'SEQ_SCAN']
+    assert [n.rows for n in result.nodes()[2:]] == [2000000., 30000.]
+    # columnar full scans are not flagged
+    assert explain._check(result, {'msf': 2000000}, explain.LARGE_ROWS,
+                          explain.LOOP_ROWS, explain.MISESTIMATE) == []
+
+    result = explain._duckdb_plan(DUCKDB_PROFILE, analyze=True)
+    assert result.root.node_type == 'ORDER_BY'
+    assert result.root.children[0].actual_rows == 2000000
+    assert result.execution_seconds == 2.5
+    assert _kinds(result) == ['spill']
+
+def test_plan_on_sqlite(sqlite_engine):
+    result = wrds.CRSPQuery(engine=sqlite_engine).explain(large_rows=1)
+    assert result.dialect == 'sqlite'
+    assert 'msf' in [n.table for n in result.nodes()]
+    assert 'seq_scan' in _kinds(result)
+
+    result = wrds.FUNDAQuery(engine=sqlite_engine).explain(analyze=True)
+    assert result.analyze and result.execution_seconds is not None
+    assert result.root.actual_rows > 0
+
+def test_extract_join(sqlite_engine):
+    meta = sa.MetaData()
+    msf = sa.Table('msf', meta, autoload_with=sqlite_engine)
+    funda = sa.Table('funda', meta, autoload_with=sqlite_engine)
+    query = sa.select([msf.c.permno, funda.c.at]).select_from(
+        msf.join(funda, sa.extract('year', msf.c.date) ==
+                 sa.extract('year', funda.c.datadate)))
+    problems = explain._extract_joins(query, sqlite_engine.dialect)
+    assert [p.kind for p in problems] == ['extract_join']
+    assert 'extract()' in problems[0].message
@@ -0,0 +1,99 @@
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wrds import ff
+
+# layout of F-F_Research_Data_Factors.CSV: a preamble, the monthly table,
+# then the annual factors
+MONTHLY = '''This file was created by CMPT_ME_BEME_RETS using the 202312 CRSP database.
+The 1-month TBill return is from Ibbotson and Associates, Inc.
+
+,Mkt-RF,SMB,HML,RF
+192607,    2.96,   -2.56,   -2.43,    0.22
+192608,    2.64,   -1.17,    3.82,    0.25
+192609,    0.36,   -1.40,  -99.99,    0.23
+
+ Annual Factors: January-December
+,Mkt-RF,SMB,HML,RF
+1927,   29.47,   -2.04,   -4.54,    3.12
+
+Copyright 2023 Kenneth R. French
+'''
+
+DAILY = '''This file was created by CMPT_ME_BEME_RETS_DAILY using the 202312 CRSP database.
+
+,Mkt-RF,SMB,HML,RF
+20231228,   -0.01,   -0.28,    0.03,   0.021
+20231229,   -0.38,   -0.13,    0.26,   0.021
+
+Copyright 2023 Kenneth R. French
+'''
+
+def test_parse_monthly():
+    df = ff.parse(MONTHLY)
+    assert list(df.columns) == ['Mkt_rf', 'SMB', 'HML', 'rf']
+    assert list(df.index) == [pd.Timestamp('1926-07-01'),
+                              pd.Timestamp('1926-08-01'),
+                              pd.Timestamp('1926-09-01')]
+    assert df.index.name == 'date'
+    assert df.loc['1926-08-01', 'HML'] == 3.82
+    # the missing-value code, and nothing of the annual table
+    assert np.isnan(df.loc['1926-09-01', 'HML'])
+    assert (df.dtypes == float).all()
+
+def test_parse_daily():
+    df = ff.parse(DAILY, freq='D')
+    assert list(df.index) == [pd.Timestamp('2023-12-28'),
+                              pd.Timestamp('2023-12-29')]
+    assert df['Mkt_rf'].tolist() == [-0.01, -0.38]
+
+def test_parse_without_table():
+    with pytest.raises(ValueError):
+        ff.parse('Copyright 2023 Kenneth R. French\n')
+
+def _write_zip(directory, name, text):
+    path = os.path.join(str(directory), name + '_CSV.zip')
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr(name + '.CSV', text)
+    return path
+
+def test_store_parses_once(tmp_path):
+    name = ff.DATASETS[('ff3', 'M')]
+    source = _write_zip(tmp_path, name, MONTHLY)
+    store = ff.FactorStore(str(tmp_path), download=False)
+
+    df = store.load()
+    cached = os.path.join(str(tmp_path), name + '.pickle')
+    assert os.path.exists(cached)
+    pd.testing.assert_frame_equal(df, ff.parse(MONTHLY))
+
+    # the pickle is read while it is newer than the source...
+    pd.to_pickle(df.iloc[:1], cached)
+    assert len(store.load()) == 1
+    # ...and the source re-parsed once it changes
+    os.utime(source, (os.path.getmtime(cached) + 10,)*2)
+    assert len(store.load()) == 3
+
+def test_store_without_source(tmp_path):
+    store = ff.FactorStore(str(tmp_path), download=False)
+    with pytest.raises(ValueError):
+        store.load('ff5', 'D')
+
+def test_factors_df(tmp_path):
+    _write_zip(tmp_path, ff.DATASETS[('ff3', 'M')], MONTHLY)
+    store = ff.FactorStore(str(tmp_path), download=False)
+    ff.clear()
+    try:
+        df = ff.factors_df(store=store)
+        assert df.index[0] == pd.Timestamp('1926-07-31')
+        assert ff.factors_df(end=False, store=store).index[0] == \
+            pd.Timestamp('1926-07-01')
+        # callers get copies of the memoized frame
+        df['SMB'] = 0.
+        assert ff.factors_df(store=store)['SMB'].iloc[0] == -2.56
+    finally:
+        ff.clear()
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import wrds
+from wrds import comp
+
+ANOMALIES = ['nsi', 'tac', 'noa', 'gpa', 'ag', 'ia', 'roa', 'oscore']
+FLAGS = dict(nsi=True, tac=True, noa=True, gp=True, ag=True, ia=True,
+             roa=True, oscore=True)
+
+def _sorted(df, permno, names=ANOMALIES):
+    keys = ['gvkey', 'datadate'] + (['lpermno'] if permno else [])
+    df = df.reset_index()
+    df['gvkey'] = df['gvkey'].astype(str)
+    df['datadate'] = pd.to_datetime(df['datadate'])
+    return df.sort_values(keys).reset_index(drop=True)[keys + names]
+
+@pytest.mark.parametrize('permno', [True, False])
+def test_sql_matches_comp(sqlite_engine, permno):
+    """compute='sql' equals comp.* on the frame read with compute='pandas'."""
+    raw = wrds.FUNDAQuery(engine=sqlite_engine, permno=permno,
+                          **FLAGS).read_frame().sort_index()
+    expected = pd.concat([raw, comp.compute_anomalies(raw, ANOMALIES)],
+                         axis=1)
+    # the server returns NULL where pandas divides by zero
+    expected = _sorted(expected, permno).replace([np.inf, -np.inf], np.nan)
+
+    sql = wrds.FUNDAQuery(engine=sqlite_engine, permno=permno,
+                          compute='sql', **FLAGS).read_frame()
+    sql = _sorted(sql, permno)
+
+    pd.testing.assert_frame_equal(sql.iloc[:, :-len(ANOMALIES)],
+                                  expected.iloc[:, :-len(ANOMALIES)],
+                                  check_dtype=False)
+    for name in ANOMALIES:
+        np.testing.assert_allclose(sql[name].astype(float).values,
+                                   expected[name].astype(float).values,
+                                   rtol=1e-9, err_msg=name)
+    assert expected['nsi'].notnull().any()
+
+@pytest.mark.parametrize('flag', sorted(FLAGS))
+def test_single_flag(sqlite_engine, flag):
+    """Each flag alone selects every input its characteristic needs."""
+    name = 'gpa' if flag == 'gp' else flag
+    raw = wrds.FUNDAQuery(engine=sqlite_engine, permno=False,
+                          **{flag: True}).read_frame().sort_index()
+    expected = pd.concat([raw, comp.compute_anomalies(raw, [name])], axis=1)
+    expected = _sorted(expected, False, [name]).replace([np.inf, -np.inf],
+                                                         np.nan)
+
+    sql = wrds.FUNDAQuery(engine=sqlite_engine, permno=False, compute='sql',
+                          **{flag: True}).read_frame()
+    sql = _sorted(sql, False, [name])
+    np.testing.assert_allclose(sql[name].astype(float).values,
+                               expected[name].astype(float).values,
+                               rtol=1e-9, err_msg=name)
+    assert expected[name].notnull().any()
+
+def test_compute_anomalies_plan_stats(sqlite_engine):
+    raw = wrds.FUNDAQuery(engine=sqlite_engine, tac=True, noa=True, ag=True,
+                          ia=True).read_frame().sort_index()
+    names = ['tac', 'noa', 'ag', 'ia']
+    anomalies, plan = comp.compute_anomalies(raw, names, return_plan=True)
+    # tac: lag and dif of act, che, lct, dlc, txp, then lag(at);
+    # ia: lag and dif of ppegt, invt; noa, ag and ia reuse lag(at)
+    assert plan.stats == {'computed': 15, 'reused': 3}
+    pd.testing.assert_frame_equal(anomalies,
+                                  comp.compute_anomalies(raw, names))
@@ -0,0 +1,40 @@
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+import wrds
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _loaded_after(code):
+    """Modules of interest in sys.modules after running `code` afresh."""
+    script = ('import sys\n{0}\n'
+              'print(" ".join(sorted(m for m in sys.modules if m in '
+              '("pandas", "sqlalchemy") or m.startswith("wrds."))))'
+              .format(code))
+    out = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+    return set(out.decode().split())
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='no module __getattr__: imported up front')
+def test_import_is_lazy():
+    assert _loaded_after('import wrds') == set()
+    assert _loaded_after('import wrds; wrds.crsp') >= \
+        set(['wrds.crsp', 'pandas'])
+    # comp needs pandas but not SQLAlchemy
+    assert 'sqlalchemy' not in _loaded_after('import wrds; wrds.comp.GPA')
+    assert _loaded_after('import wrds; wrds.CRSPQuery') >= \
+        set(['wrds.query', 'sqlalchemy'])
+
+def test_every_export_resolves():
+    for name, module in wrds._EXPORTS.items():
+        module = importlib.import_module('wrds.' + module)
+        assert getattr(wrds, name) is getattr(module, name)
+    for name in wrds._SUBMODULES:
+        assert getattr(wrds, name).__name__ == 'wrds.' + name
+    assert set(wrds.__all__) <= set(dir(wrds))
+    with pytest.raises(AttributeError):
+        wrds.no_such_attribute
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+import wrds
+from wrds import link
+
+@pytest.fixture(scope='module')
+def linker(sqlite_engine):
+    return link.linker(sqlite_engine, refresh=True)
+
+def _keyed(df, keys):
+    df = df.reset_index()
+    df['gvkey'] = df['gvkey'].astype(str)
+    for col in ('lpermno', 'lpermco'):
+        df[col] = df[col].astype('int64')
+    return df.sort_values(keys).reset_index(drop=True)
+
+@pytest.mark.parametrize('cls,date', [(wrds.FUNDAQuery, 'datadate'),
+                                      (wrds.FUNDQQuery, 'datadate')])
+def test_linker_matches_server_join(sqlite_engine, linker, cls, date):
+    server = cls(engine=sqlite_engine, permno=True).read_frame()
+    local = linker.link(cls(engine=sqlite_engine, permno=False).read_frame(),
+                        by='gvkey', date=date, how='inner')
+    keys = ['gvkey', date, 'lpermno']
+    server, local = _keyed(server, keys), _keyed(local, keys)
+    assert len(server)
+    pd.testing.assert_frame_equal(local[server.columns], server,
+                                  check_categorical=False)
+
+def test_linker_by_permno_round_trips(sqlite_engine, linker):
+    funda = wrds.FUNDAQuery(engine=sqlite_engine, permno=True).read_frame()
+    funda = funda.reset_index()
+    back = linker.link(funda.rename(columns={'gvkey': 'source'}),
+                       by='permno', key='lpermno', date='datadate')
+    assert (back['gvkey'].astype(str) == back['source'].astype(str)).all()
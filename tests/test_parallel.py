@@ -0,0 +1,43 @@
+import logging
+
+import pandas as pd
+import pytest
+
+import wrds
+
+def _sorted(df):
+    df = df.reset_index()
+    for col in df.columns:
+        if str(df[col].dtype) == 'category':
+            # concatenated chunks keep categorical index levels as objects
+            df[col] = df[col].astype(object)
+    return df.sort_values([c for c in ('gvkey', 'permno', 'date', 'lpermno')
+                           if c in df]).reset_index(drop=True)
+
+@pytest.mark.parametrize('cls,kwargs', [
+    (wrds.CRSPQuery, dict(vwm=6)),
+    (wrds.FUNDAQuery, dict(nsi=True)),
+])
+def test_parallel_matches_serial(sqlite_engine, cls, kwargs):
+    serial = cls(engine=sqlite_engine, **kwargs).read_frame()
+    parallel = cls(engine=sqlite_engine, **kwargs).read_frame(parallel=3)
+    pd.testing.assert_frame_equal(_sorted(parallel), _sorted(serial),
+                                  check_like=True)
+
+@pytest.mark.parametrize('cls,kwargs', [
+    (wrds.CRSPQuery, dict(vwm=6)),
+    (wrds.FUNDAQuery, dict(permno=False)),
+])
+def test_parallel_respects_limit(sqlite_engine, cls, kwargs):
+    df = cls(engine=sqlite_engine, limit=25, **kwargs).read_frame(parallel=4)
+    assert len(df) == 25
+
+def test_parallel_memory_is_summed(sqlite_engine, caplog):
+    with caplog.at_level(logging.INFO):
+        serial = wrds.CRSPQuery(engine=sqlite_engine, vwm=6)
+        serial.read_frame()
+        parallel = wrds.CRSPQuery(engine=sqlite_engine, vwm=6)
+        parallel.read_frame(parallel=4)
+    assert parallel.memory['before'] > 0
+    assert abs(parallel.memory['before'] - serial.memory['before']) < \
+        0.05*serial.memory['before']
@@ -0,0 +1,86 @@
+"""The query classes return the same frames on sqlite, DuckDB over Parquet
+extracts and (with WRDS_TEST_POSTGRES_URL set) PostgreSQL."""
+import os
+
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+import wrds
+from wrds import parity, synthetic
+from wrds.sql import create_functions
+
+# e.g. postgresql://user@localhost/wrds_test; its synthetic tables are replaced
+POSTGRES_URL = os.environ.get('WRDS_TEST_POSTGRES_URL')
+
+CANDIDATES = ['duckdb_engine', 'postgres_engine']
+
+@pytest.fixture(scope='session')
+def duckdb_engine(sqlite_engine, tmp_path_factory):
+    """In-memory DuckDB reading Parquet extracts of the sqlite tables."""
+    # not skipped: the duckdb extra is required to run the tests
+    import duckdb
+    directory = tmp_path_factory.mktemp('parquet')
+    con = duckdb.connect()
+    for name in synthetic.TABLES:
+        df = pd.read_sql_table(name, sqlite_engine)
+        con.from_df(df).write_parquet(str(directory.joinpath(name +
+                                                             '.parquet')))
+    con.close()
+    engine = wrds.db.get_engine('duckdb:///:memory:')
+    wrds.db.attach_parquet(engine, str(directory))
+    return engine
+
+@pytest.fixture(scope='session')
+def postgres_engine(synthetic_args):
+    if not POSTGRES_URL:
+        pytest.skip('WRDS_TEST_POSTGRES_URL is not set')
+    engine = wrds.db.get_engine(POSTGRES_URL)
+    synthetic.generate(engine, **synthetic_args)
+    create_functions(engine)
+    return engine
+
+@pytest.mark.parametrize('candidate', CANDIDATES)
+@pytest.mark.parametrize('name,cls,kwargs', parity.QUERIES,
+                         ids=[q[0] for q in parity.QUERIES])
+def test_engines_agree(request, sqlite_engine, candidate, name, cls, kwargs):
+    engine = request.getfixturevalue(candidate)
+    expected = cls(engine=sqlite_engine, **kwargs).read_frame()
+    assert len(expected)
+    problem = parity.compare(expected,
+                             cls(engine=engine, **kwargs).read_frame())
+    assert problem is None, problem
+
+def _create_table(engine, cls, kwargs, table_name):
+    q = cls(engine=engine, **kwargs)
+    q.create_table(table_name)
+    try:
+        df = pd.read_sql('SELECT * FROM {0}'.format(table_name), engine)
+    finally:
+        engine.execute('DROP TABLE {0}'.format(table_name))
+    # sqlite's CREATE TABLE AS keeps no DATE type; dates come back as text
+    for col in q.query.columns:
+        if isinstance(col.type, (sa.types.Date, sa.types.DateTime)):
+            df[col.name] = pd.to_datetime(df[col.name])
+    return df
+
+@pytest.mark.parametrize('candidate', CANDIDATES)
+@pytest.mark.parametrize('name,cls,kwargs', parity.QUERIES,
+                         ids=[q[0] for q in parity.QUERIES])
+def test_create_table_agrees(request, scratch_engine, candidate, name, cls,
+                             kwargs):
+    engine = request.getfixturevalue(candidate)
+    table_name = 'parity_' + name
+    expected = _create_table(scratch_engine, cls, kwargs, table_name)
+    assert len(expected)
+    problem = parity.compare(expected,
+                             _create_table(engine, cls, kwargs, table_name))
+    assert problem is None, problem
+
+def test_every_query_class_is_checked():
+    checked = set(q[1] for q in parity.QUERIES)
+    # synthetic builds no IBES tables
+    unchecked = set([wrds.WRDSQuery, wrds.TRGuidance])
+    exported = set(getattr(wrds, name) for name in wrds.__all__
+                   if name.endswith('Query') or name == 'TRGuidance')
+    assert exported - unchecked == checked
@@ -0,0 +1,31 @@
+import re
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import wrds
+from wrds import pgcopy
+
+class _Postgres(object):
+    dialect = postgresql.dialect()
+
+class _Cursor(object):
+    """psycopg2-like mogrify for pyformat parameters."""
+
+    def mogrify(self, sql, params):
+        return sql % dict((k, "'{0}'".format(v)) for k, v in params.items())
+
+@pytest.mark.parametrize('cls', [wrds.FUNDAQuery, wrds.FUNDQQuery])
+def test_copy_sql_renders_in_lists(sqlite_engine, cls):
+    q = cls(engine=sqlite_engine)
+    sql = pgcopy.compile_query(q.query, _Postgres(), _Cursor())
+    assert 'POSTCOMPILE' not in sql
+    assert re.search(r"linkprim IN \('P', 'C'\)", sql)
+
+def test_copy_sql_from_execute_compile(sqlite_engine):
+    # the statement _execute compiles for fetch='copy'
+    q = wrds.FUNDAQuery(engine=sqlite_engine)
+    compiled = q.query.compile(dialect=_Postgres.dialect,
+                               compile_kwargs=pgcopy.COMPILE_KWARGS)
+    sql = pgcopy.compile_query(q.query, _Postgres(), _Cursor(), compiled)
+    assert 'POSTCOMPILE' not in sql
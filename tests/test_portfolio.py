@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import wrds
+from wrds import portfolio
+
+@pytest.fixture(scope='module')
+def msf(sqlite_engine):
+    return wrds.CRSPQuery(engine=sqlite_engine, vwm=6).read_frame().sort_index()
+
+def _naive_ntile(msf, x, q):
+    """Bucket per date from np.percentile of the NYSE rows, one date at a time."""
+    out = pd.Series(np.nan, index=msf.index)
+    dates = msf.index.get_level_values('date')
+    exchcd = msf['exchcd'].astype(float).values
+    for date in np.unique(dates):
+        rows = (dates == date) & x.notnull().values
+        nyse = rows & (exchcd == 1)
+        if not nyse.any():
+            continue
+        bps = np.percentile(x.values[nyse], np.arange(1, q)*100./q)
+        out[rows] = 1 + (x.values[rows][:, None] > bps[None, :]).sum(axis=1)
+    return out
+
+def test_ntile_matches_naive_nyse_breakpoints(msf):
+    june = msf.index.get_level_values('date').month == 6
+    me = msf['me'].astype(float).where(june)
+    bucket = portfolio.ntile(me, 5, nyse=msf['exchcd'] == 1)
+    expected = _naive_ntile(msf, me, 5)
+    assert bucket.notnull().sum() > 0
+    pd.testing.assert_series_equal(bucket, expected, check_names=False)
+
+def test_ew_vw_returns_match_groupby(msf):
+    june = msf.index.get_level_values('date').month == 6
+    size = portfolio.hold(portfolio.ntile(msf['me'].where(june), 3,
+                                          nyse=msf['exchcd'] == 1))
+    weights = portfolio.value_weights(msf)
+    ret = msf['ret_adj'].astype(float)
+
+    ew = portfolio.returns(ret, size)
+    vw = portfolio.returns(ret, size, weights)
+
+    df = pd.DataFrame({'ret': ret, 'size': size, 'w': weights}).reset_index()
+    df = df[df['ret'].notnull() & df['size'].notnull()]
+    expected_ew = df.groupby(['date', 'size'])['ret'].mean().unstack()
+    df = df[df['w'] > 0]
+    df['wr'] = df['w']*df['ret']
+    sums = df.groupby(['date', 'size'])[['wr', 'w']].sum()
+    expected_vw = (sums['wr']/sums['w']).unstack()
+
+    assert len(ew) and len(vw)
+    for result, expected in ((ew, expected_ew), (vw, expected_vw)):
+        result, expected = result.align(expected, join='outer')
+        np.testing.assert_allclose(result.values, expected.values, rtol=1e-9)
+
+def test_value_weights_are_prior_month_vweight(msf):
+    weights = portfolio.value_weights(msf)
+    dates = pd.DatetimeIndex(msf.index.get_level_values('date'))
+    month = pd.Series(dates.year*12 + dates.month, index=msf.index)
+    by = msf.index.get_level_values('permno')
+    prior = msf['vweight'].astype(float).groupby(by).shift(1)
+    consecutive = (month - month.groupby(by).shift(1)) == 1
+    expected = prior.where(consecutive)
+    pd.testing.assert_series_equal(weights.astype(float), expected,
+                                   check_names=False)
+    assert expected.notnull().any()
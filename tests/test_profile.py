@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+
+import wrds
+from wrds import profile
+
+@pytest.fixture
+def compiles(sqlite_engine, monkeypatch):
+    """Engine on the synthetic database counting statement compilations."""
+    engine = sa.create_engine(sqlite_engine.url)
+    counted = []
+    base = engine.dialect.statement_compiler
+
+    class Compiler(base):
+        def __init__(self, *args, **kwargs):
+            counted.append(1)
+            super(Compiler, self).__init__(*args, **kwargs)
+
+    monkeypatch.setattr(engine.dialect, 'statement_compiler', Compiler)
+    yield engine, counted
+    engine.dispose()
+
+def test_statement_is_compiled_once(compiles):
+    engine, counted = compiles
+    # the CCM link join binds linkprim IN (...) as an expanding parameter
+    q = wrds.FUNDAQuery(engine=engine, permno=True)
+    del counted[:]
+    df = q.read_frame()
+    assert len(df)
+    assert counted == [1]
+    assert q.stats.stages['compile'].calls == 1
+
+def test_first_row_excludes_consumer_idle_time(sqlite_engine):
+    q = wrds.CRSPQuery(engine=sqlite_engine, vwm=6)
+    chunks = q.read_frame(chunksize=1000)
+    # the caller takes its time before asking for the first chunk
+    time.sleep(0.2)
+    next(chunks)
+    chunks.close()
+    stages = q.stats.stages
+    assert stages['first_row'].calls == 1
+    assert stages['first_row'].seconds < 0.2
+    assert stages['first_row'].seconds == pytest.approx(
+        stages['execute'].seconds + stages['fetch'].seconds)
+
+def test_peak_rss_sees_spikes_inside_a_stage():
+    stats = profile.QueryStats('test')
+    # above the process's peak so far, then freed before the stage ends
+    size = max(profile.peak_rss() - profile.rss(), 0) + 64*2**20
+    with stats.timer('to_df'):
+        spike = np.ones(size//8)
+        del spike
+    stage = stats.stages['to_df']
+    assert stage.peak_rss_delta >= 48*2**20
+    assert stage.peak_rss == profile.peak_rss()
@@ -0,0 +1,197 @@
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wrds import util
+
+def _panel(seed=0, firms=30, years=12, shuffle=True):
+    """Annual (gvkey, date) panel with gaps, NaN dates and missing values."""
+    rng = np.random.RandomState(seed)
+    rows = []
+    for g in range(firms):
+        first = rng.randint(0, 4)
+        for y in range(first, first + rng.randint(2, years)):
+            if rng.rand() < 0.15:
+                continue                    # a missing fiscal year
+            date = pd.Timestamp(1990 + y, 6, 30)
+            if rng.rand() < 0.05:
+                date = pd.NaT
+            rows.append(('{0:06d}'.format(g), date))
+    index = pd.MultiIndex.from_tuples(rows, names=['gvkey', 'date'])
+    df = pd.DataFrame({'at': rng.lognormal(5, 1, len(index)),
+                       'ni': rng.randn(len(index))}, index=index)
+    df.loc[rng.rand(len(df)) < 0.1, 'at'] = np.nan
+    if shuffle:
+        df = df.iloc[rng.permutation(len(df))]
+    return df
+
+def _months(index):
+    dates = pd.DatetimeIndex(index.get_level_values('date'))
+    months = np.asarray(dates.year*12 + dates.month, dtype=float)
+    months[np.asarray(dates.isnull())] = np.nan
+    return pd.Series(months, index=index)
+
+def _reference_lag(x, n, period=None):
+    lagged = x.groupby(level='gvkey').shift(n)
+    if period:
+        months = _months(x.index)
+        gap = months - months.groupby(level='gvkey').shift(n)
+        lagged[~(gap == n*period)] = np.nan
+    return lagged
+
+@pytest.mark.parametrize('shuffle', [False, True])
+@pytest.mark.parametrize('n', [1, 2, -1])
+@pytest.mark.parametrize('period', [None, 12])
+def test_lag_matches_groupby_shift(shuffle, n, period):
+    df = _panel(shuffle=shuffle)
+    for col in ('at', 'ni'):
+        expected = _reference_lag(df[col], n, period)
+        pd.testing.assert_series_equal(
+            util.LAG(df[col], n, period=period), expected)
+        pd.testing.assert_series_equal(
+            util.DIF(df[col], n, period=period), df[col] - expected)
+
+def test_lag_dataframe_and_integers():
+    df = _panel()
+    df['year'] = pd.DatetimeIndex(
+        df.index.get_level_values('date')).year.fillna(0).astype(int)
+    lagged = util.LAG(df[['at', 'year']])
+    expected = df[['at', 'year']].astype(float).groupby(level='gvkey').shift(1)
+    pd.testing.assert_frame_equal(lagged, expected)
+
+def test_lag_length_mismatch():
+    df = _panel()
+    panel = util.PanelIndex(df.index)
+    with pytest.raises(ValueError):
+        panel.lag(df['at'].iloc[1:])
+
+def _reference_rolling_sum(x, n, skip, period, min_obs):
+    months = _months(x.index)
+    out = pd.Series(np.nan, index=x.index)
+    for i in range(len(x)):
+        m, g = months.iloc[i], x.index[i][0]
+        if np.isnan(m):
+            continue
+        lo, hi = m - (skip + n - 1)*period, m - skip*period
+        same = (x.index.get_level_values('gvkey') == g) & \
+            (months.values >= lo) & (months.values <= hi)
+        values = x.values[same]
+        values = values[~np.isnan(values)]
+        if len(values) >= min_obs:
+            out.iloc[i] = values.sum()
+    return out
+
+@pytest.mark.parametrize('n,skip', [(3, 0), (2, 1)])
+def test_rolling_sum_with_gaps_and_nan_dates(n, skip):
+    df = _panel(seed=1)
+    panel = util.PanelIndex(df.index, period=12)
+    result = panel.rolling_sum(df['at'], n, skip, min_obs=1)
+    expected = _reference_rolling_sum(df['at'], n, skip, 12, 1)
+    np.testing.assert_allclose(result.values, expected.values)
+
+def test_rolling_sum_without_period():
+    df = _panel(shuffle=False)
+    panel = util.PanelIndex(df.index)
+    result = panel.rolling_sum(df['ni'], 3)
+    expected = df['ni'].groupby(level='gvkey').transform(
+        lambda x: x.rolling(3).sum())
+    np.testing.assert_allclose(result.values, expected.values)
+
+def test_panel_index_is_shared_by_views_of_one_index():
+    df = _panel()
+    panel = util.panel_index(df.index)
+    # columns and arithmetic get their own index objects on newer pandas,
+    # all viewing the same codes
+    assert util.panel_index(df['at'].index) is panel
+    assert util.panel_index((df['at'] - df['ni']).index) is panel
+    assert util.panel_index(df.index, period=12) is not panel
+
+    pd.testing.assert_series_equal(util.LAG(df['at']),
+                                   _reference_lag(df['at'], 1))
+    pd.testing.assert_series_equal(util.DIF(df['ni']),
+                                   df['ni'] - _reference_lag(df['ni'], 1))
+    assert list(panel._takes) == [1]
+
+    n = len(util._panels)
+    del df, panel
+    gc.collect()
+    assert len(util._panels) < n
+
+def test_panel_index_is_not_shared_by_other_panels():
+    df = _panel(shuffle=False)
+    util.LAG(df['at'])
+    # a slice views the same codes at another offset and length
+    part = df.iloc[5:]
+    pd.testing.assert_series_equal(util.LAG(part['at']),
+                                   _reference_lag(part['at'], 1))
+    # new gvkeys on the same codes: all firms become one
+    merged = df.copy()
+    merged.index = merged.index.set_levels(
+        ['000000']*len(merged.index.levels[0]), level='gvkey',
+        verify_integrity=False)
+    pd.testing.assert_series_equal(util.LAG(merged['at']),
+                                   _reference_lag(merged['at'], 1))
+    # the same codes under other level names
+    renamed = df.rename_axis(['date', 'gvkey'])
+    lagged = util.LAG(renamed['at'], group='date')
+    expected = renamed['at'].groupby(level='date').shift(1)
+    pd.testing.assert_series_equal(lagged, expected)
+
+def _daily_panel(seed=0, firms=6, days=40):
+    """Daily (permno, date) returns with missing days and missing returns."""
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('2005-01-03', periods=days, name='date')
+    mkt = pd.Series(rng.randn(days)*0.01, index=dates, name='mkt')
+    smb = pd.Series(rng.randn(days)*0.01, index=dates, name='smb')
+    rows, ret = [], []
+    for permno in range(10001, 10001 + firms):
+        beta = rng.rand()*2
+        for d in dates[rng.randint(0, 5):]:
+            if rng.rand() < 0.1:
+                continue                    # not traded that day
+            rows.append((permno, d))
+            ret.append(beta*mkt[d] + 0.5*smb[d] + rng.randn()*0.02)
+    index = pd.MultiIndex.from_tuples(rows, names=['permno', 'date'])
+    ret = pd.Series(ret, index=index, name='ret')
+    ret[rng.rand(len(ret)) < 0.05] = np.nan
+    return ret, pd.concat([mkt, smb], axis=1)
+
+def _reference_rolling_ols(y, X, window, min_obs):
+    """One np.linalg.lstsq per window over the group's trailing rows."""
+    X = X.reindex(y.index.get_level_values('date'))
+    out = pd.DataFrame(np.nan, index=y.index,
+                       columns=['alpha'] + ['beta_{0}'.format(c)
+                                            for c in X.columns] + ['ivol'])
+    out['n'] = 0
+    permnos = y.index.get_level_values('permno')
+    for permno in np.unique(permnos):
+        rows = np.flatnonzero(permnos == permno)
+        for k, i in enumerate(rows):
+            w = rows[max(0, k - window + 1):k + 1]
+            Y, Z = y.values[w], X.values[w]
+            ok = ~np.isnan(Y) & ~np.isnan(Z).any(axis=1)
+            out.iloc[i, -1] = ok.sum()
+            if ok.sum() < max(min_obs, Z.shape[1] + 2):
+                continue
+            Z = np.column_stack([np.ones(ok.sum()), Z[ok]])
+            coef = np.linalg.lstsq(Z, Y[ok], rcond=None)[0]
+            resid = Y[ok] - Z.dot(coef)
+            out.iloc[i, :len(coef)] = coef
+            out.iloc[i, len(coef)] = np.sqrt(resid.dot(resid)/(ok.sum() -
+                                                              len(coef)))
+    return out
+
+@pytest.mark.parametrize('window,min_obs', [(10, None), (15, 8)])
+def test_rolling_ols_matches_lstsq_per_window(window, min_obs):
+    y, X = _daily_panel()
+    result = util.rolling_ols(y, X, window, min_obs)
+    expected = _reference_rolling_ols(y, X, window, min_obs or window)
+    # the first rows of each firm, and windows with missing returns, are
+    # below min_obs
+    assert result['ivol'].isnull().any() and result['ivol'].notnull().any()
+    assert (result['n'].values == expected['n'].values).all()
+    for col in expected.columns[:-1]:
+        np.testing.assert_allclose(result[col].values, expected[col].values,
+                                   rtol=1e-8, atol=1e-12, err_msg=col)
@@ -1,7 +1,41 @@
-from query import *
-from createtable import *
-import crsp
-import comp
-import ff
-import util
-import sql
\ No newline at end of file
+"""WRDS queries and characteristics for pandas.
+
+Submodules and the query classes are imported on first access, so
+``import wrds`` is cheap: ``wrds.comp.GPA`` loads comp (and pandas) only,
+and SQLAlchemy is loaded with the first query class. On Python < 3.7,
+which has no module __getattr__, everything is imported up front.
+"""
+import importlib
+import sys
+
+# attribute -> submodule defining it
+_EXPORTS = {'WRDSQuery': 'query', 'FUNDAQuery': 'query',
+            'FUNDQQuery': 'query', 'CRSPQuery': 'query',
+            'CCMNamesQuery': 'query', 'CCMLinkQuery': 'query',
+            'TRGuidance': 'query', 'CreateTableAs': 'createtable',
+            'build_log': 'createtable', 'last_build': 'createtable'}
+
+_SUBMODULES = ('aio', 'cache', 'comp', 'createtable', 'crsp', 'db',
+               'explain', 'ff', 'link', 'parity', 'pgcopy', 'portfolio',
+               'profile', 'query', 'schema', 'sql', 'synthetic', 'util')
+
+__all__ = sorted(_EXPORTS) + ['comp', 'crsp', 'ff', 'sql', 'util']
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        module = importlib.import_module('.' + _EXPORTS[name], __name__)
+        value = getattr(module, name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError('module {0!r} has no attribute {1!r}'
+                             .format(__name__, name))
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | set(_SUBMODULES))
+
+if sys.version_info < (3, 7):
+    for _name in __all__:
+        globals()[_name] = __getattr__(_name)
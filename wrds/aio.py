@@ -0,0 +1,173 @@
+"""asyncio interface running several WRDSQuery reads concurrently.
+
+    crsp, funda, names = await gather_frames(wrds.CRSPQuery(),
+                                             wrds.FUNDAQuery(),
+                                             wrds.CCMNamesQuery())
+
+Each read_frame runs on a worker thread with its own pooled connection, so
+the server executes the queries at the same time and one query's DataFrame
+conversion overlaps the others' server time: the wall time is about that of
+the slowest query rather than the sum. Scripts without an event loop can
+call read_frames(...) instead.
+
+A read that is cancelled or exceeds its timeout cancels its statements on
+the server (psycopg2 connection.cancel(), SQLite/DuckDB interrupt()) and
+re-raises once the worker has stopped and returned its connections.
+Requires Python 3.5+.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+# worker threads shared by all reads; the engine pool bounds how many
+# statements actually run at once
+MAX_WORKERS = 16
+# seconds to wait for a cancelled worker to stop
+GRACE = 10.
+
+_executor = None
+_watched = {}
+_lock = threading.Lock()
+
+class QueryCancelled(Exception):
+    """Raised in a cancelled read's worker before it runs a statement."""
+
+def executor():
+    """The thread pool running read_frame_async workers."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(MAX_WORKERS)
+    return _executor
+
+class Cancel(object):
+    """The DBAPI connections one read is using, to cancel its statements."""
+
+    def __init__(self):
+        self.cancelled = False
+        self.connections = {}
+
+    def watch(self, dbapi_connection):
+        with _lock:
+            if self.cancelled:
+                raise QueryCancelled('read_frame was cancelled.')
+            self.connections[id(dbapi_connection)] = dbapi_connection
+            _watched[id(dbapi_connection)] = self
+
+    def cancel(self):
+        """Stops further statements and interrupts the running ones."""
+        with _lock:
+            self.cancelled = True
+            connections = list(self.connections.values())
+        return sum(_interrupt(c) for c in connections)
+
+def _interrupt(dbapi_connection):
+    for name in ('cancel', 'interrupt'):
+        method = getattr(dbapi_connection, name, None)
+        if method is not None:
+            try:
+                method()
+                return True
+            except Exception:
+                logging.warning('Cannot cancel the statement.', exc_info=True)
+                return False
+    return False
+
+def _before_execute(conn, cursor, statement, parameters, context,
+                    executemany):
+    handle = getattr(context, 'execution_options', {}).get('wrds_cancel')
+    if handle is not None:
+        handle.watch(conn.connection.connection)
+
+def _checkin(dbapi_connection, connection_record):
+    # a connection back in the pool no longer belongs to the read
+    with _lock:
+        handle = _watched.pop(id(dbapi_connection), None)
+        if handle is not None:
+            handle.connections.pop(id(dbapi_connection), None)
+
+def _listen(engine):
+    with _lock:
+        if not event.contains(engine, 'before_cursor_execute',
+                              _before_execute):
+            event.listen(engine, 'before_cursor_execute', _before_execute)
+            event.listen(engine, 'checkin', _checkin)
+
+async def read_frame_async(query, timeout=None, **kwargs):
+    """Awaitable query.read_frame(**kwargs) on a worker thread.
+
+       Parameters
+       ----------
+       query: WRDSQuery
+       timeout: seconds before the read is cancelled and
+           asyncio.TimeoutError raised (default: None, no limit)
+       kwargs: read_frame options; chunksize is not supported, since the
+           whole result is returned
+
+    """
+    assert not kwargs.get('chunksize'), \
+        "read_frame_async returns whole frames, not chunks"
+    _listen(query.engine)
+    handle = Cancel()
+
+    def read():
+        query._cancel = handle
+        try:
+            return query.read_frame(**kwargs)
+        finally:
+            query._cancel = None
+
+    work = executor().submit(read)
+    future = asyncio.wrap_future(work)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except BaseException:
+        # the read itself failed, or was cancelled/timed out while queued
+        # (work.cancel() succeeds) or running
+        if not future.done() and not work.cancel():
+            n = handle.cancel()
+            logging.info('read_frame {0} cancelled ({1} statements '
+                         'interrupted).'.format(type(query).__name__, n))
+            await asyncio.wait([future], timeout=GRACE)
+            if future.done() and not future.cancelled():
+                future.exception()
+        raise
+
+async def gather_frames(*queries, timeout=None, return_exceptions=False,
+                        **kwargs):
+    """Reads `queries` concurrently; returns their frames in order.
+
+       Parameters
+       ----------
+       queries: WRDSQuery objects, or (query, read_frame options) pairs
+       timeout: seconds allowed for each query (default: None)
+       return_exceptions: return a failed query's exception in its place
+           (default: False: the first failure cancels the other reads and
+           is raised)
+       kwargs: read_frame options for all queries
+
+    """
+    tasks = []
+    for q in queries:
+        q, options = q if isinstance(q, tuple) else (q, {})
+        tasks.append(asyncio.ensure_future(
+            read_frame_async(q, timeout, **dict(kwargs, **options))))
+    try:
+        return await asyncio.gather(*tasks,
+                                    return_exceptions=return_exceptions)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+def read_frames(*queries, **kwargs):
+    """gather_frames for code without a running event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(gather_frames(*queries, **kwargs))
+    finally:
+        loop.close()
@@ -0,0 +1,242 @@
+"""Content-addressed local cache of read_frame results.
+
+Entries are keyed by a hash of the compiled SQL, its bind parameters, the
+query class and the _to_df options, and stored as Parquet files. Each entry
+records the modification state of the query's source tables; an entry whose
+tables have changed since it was written is treated as stale and removed.
+The directory is kept under a size limit by evicting least recently used
+entries. Reads from databases whose changes cannot be detected (in-memory
+tables, databases other than PostgreSQL, sqlite and DuckDB) are not cached.
+
+Enable it for the whole process with ``cache.enable('/scratch/wrds-cache')``
+(or the ``WRDS_RESULT_CACHE`` / ``WRDS_RESULT_CACHE_SIZE`` environment
+variables), or per call with ``read_frame(cache=ResultCache(...))``.
+Pass ``cache=False`` to bypass it.
+"""
+import os
+import re
+import glob
+import json
+import hashlib
+import logging
+import threading
+
+import sqlalchemy as sa
+from sqlalchemy.sql import visitors
+
+from .util import parse_bytes
+
+_default = None
+_lock = threading.Lock()
+
+def enable(directory, max_bytes='10GB'):
+    """Sets the process-wide default ResultCache."""
+    global _default
+    _default = ResultCache(directory, max_bytes)
+    return _default
+
+def disable():
+    global _default
+    _default = None
+
+def default():
+    """The process-wide ResultCache, if enabled (or set in the environment)."""
+    global _default
+    if _default is None and os.environ.get('WRDS_RESULT_CACHE'):
+        with _lock:
+            if _default is None:
+                enable(os.environ['WRDS_RESULT_CACHE'],
+                       os.environ.get('WRDS_RESULT_CACHE_SIZE', '10GB'))
+    return _default
+
+def source_tables(query):
+    """Names of the tables a selectable reads from."""
+    return sorted(set(t.name for t in visitors.iterate(query, {})
+                      if isinstance(t, sa.Table)))
+
+def source_state(engine, tables):
+    """Token that changes when any of `tables` is modified, or None when
+    changes cannot be detected (the result is then not cached).
+
+    On PostgreSQL this uses the table OIDs and the insert/update/delete
+    counters in pg_stat_all_tables. On sqlite and DuckDB it combines a
+    fingerprint of the tables' columns with the size and modification time
+    of the database file, its write-ahead log, and the Parquet files behind
+    DuckDB views (see db.attach_parquet). Tables held in memory, and other
+    databases, have no token.
+    """
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        stats = sa.sql.table('pg_stat_all_tables',
+                             *[sa.sql.column(c) for c in
+                               ('relid', 'schemaname', 'relname', 'n_tup_ins',
+                                'n_tup_upd', 'n_tup_del')])
+        query = sa.select([stats.c.schemaname, stats.c.relname,
+                           stats.c.relid, stats.c.n_tup_ins,
+                           stats.c.n_tup_upd, stats.c.n_tup_del]).\
+                    where(stats.c.relname.in_(tables)).\
+                    order_by(stats.c.schemaname, stats.c.relname)
+        state = [tuple(str(v) for v in row) for row in engine.execute(query)]
+        return hashlib.sha1(repr(state).encode('utf-8')).hexdigest()
+
+    if dialect not in ('sqlite', 'duckdb'):
+        return None
+
+    from .schema import fingerprint
+    state = [fingerprint(engine, tables)]
+    database = engine.url.database
+    in_memory = not database or database == ':memory:'
+    if not in_memory:
+        # sqlite writes to <db>-wal, DuckDB to <db>.wal
+        state += _files([database, database + '-wal', database + '.wal'])
+
+    if dialect == 'duckdb':
+        views = dict((name, sql) for name, sql in engine.execute(
+            sa.text('SELECT view_name, sql FROM duckdb_views() '
+                    'WHERE view_name IN :names').bindparams(
+                sa.bindparam('names', expanding=True)),
+            names=list(tables)))
+        for name in sorted(views):
+            paths = [p.replace("''", "'")
+                     for p in _PARQUET.findall(views[name])]
+            if not paths:
+                # a view over other tables: those are checked themselves
+                continue
+            state += [views[name]] + _files(paths)
+        if in_memory and set(tables) - set(views):
+            return None
+    elif in_memory:
+        return None
+    return hashlib.sha1(repr(state).encode('utf-8')).hexdigest()
+
+# file paths in the view definitions written by db.attach_parquet
+_PARQUET = re.compile(r"read_parquet\('((?:[^']|'')*)'")
+
+def _files(patterns):
+    """(path, size, mtime) of the existing files matching `patterns`."""
+    files = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            st = os.stat(path)
+            files.append((path, st.st_size, repr(st.st_mtime)))
+    return files
+
+class ResultCache(object):
+    """On-disk Parquet cache of query results with LRU size eviction.
+
+        Parameters
+        ----------
+        directory: str
+            where entries are stored (created if missing)
+        max_bytes: int or str, default '10GB'
+            total size above which least recently used entries are evicted
+
+    """
+
+    def __init__(self, directory, max_bytes='10GB'):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('ResultCache requires pyarrow for Parquet files.')
+
+        self.directory = directory
+        self.max_bytes = parse_bytes(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'stale': self.stale, 'evictions': self.evictions}
+
+    def key(self, query, engine, options=None, name=''):
+        """Hash of the compiled SQL, bind parameters and _to_df options."""
+        compiled = query.compile(dialect=engine.dialect)
+        params = sorted((k, repr(v)) for k, v in compiled.params.items())
+        options = sorted((k, repr(v)) for k, v in (options or {}).items())
+        content = repr((name, engine.dialect.name, str(compiled), params,
+                        options))
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.parquet', base + '.json'
+
+    def get(self, key, state):
+        """Cached DataFrame for `key`, or None if missing or stale."""
+        import pandas as pd
+
+        data, meta = self._paths(key)
+        with self._lock:
+            try:
+                with open(meta) as f:
+                    entry = json.load(f)
+            except (IOError, OSError, ValueError):
+                self.misses += 1
+                return None
+
+            if entry.get('state') != state:
+                logging.debug('Result cache entry {0} is stale.'.format(key))
+                self.stale += 1
+                self.misses += 1
+                self._remove(key)
+                return None
+
+            try:
+                df = pd.read_parquet(data)
+            except Exception as e:
+                logging.warning('Dropping unreadable cache entry {0}: {1}'
+                                .format(key, e))
+                self.misses += 1
+                self._remove(key)
+                return None
+
+            # LRU: the data file's mtime is its last use
+            os.utime(data, None)
+            self.hits += 1
+        logging.debug('Result cache hit {0} ({1} rows).'.format(key, len(df)))
+        return df
+
+    def put(self, key, state, df, sql=''):
+        """Stores `df` under `key` and evicts old entries over max_bytes."""
+        data, meta = self._paths(key)
+        tmp = '{0}.{1}.tmp'.format(data, os.getpid())
+        try:
+            df.to_parquet(tmp)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            os.rename(tmp, data)
+            with open(meta, 'w') as f:
+                json.dump({'state': state, 'rows': len(df), 'sql': sql}, f)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for path in glob.glob(os.path.join(self.directory, '*.parquet')):
+                self._remove(os.path.basename(path)[:-len('.parquet')])
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*.parquet')):
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(os.path.basename(path)[:-len('.parquet')])
+            total -= size
+            self.evictions += 1
@@ -1,43 +1,208 @@
 import pandas as pd
+import logging
 from numpy import log
 from .util import *
 
 # COMPUSTAT Convenience Functions
 
+class AnomalyPlan(object):
+    """Memoized intermediates for computing several anomalies at once.
+
+    Anomaly formulas ask the plan for columns, derived terms, lags and
+    differences by name. Each distinct intermediate is computed once and
+    reused by every formula that needs it, and all lags share one sorted
+    PanelIndex.
+
+        Parameters
+        ----------
+        data: pandas.DataFrame or dict of pandas.Series
+            FUNDA/FUNDQ variables (lowercase names) on a (gvkey, date) index
+        group, date, period:
+            passed to util.PanelIndex
+
+    """
+
+    def __init__(self, data, group='gvkey', date='date', period=None):
+        self.data = data
+        self.group = group
+        self.date = date
+        self.period = period
+        self.panel = None
+        self.derived = {}
+        self.computed = 0
+        self.reused = 0
+        self._cache = {}
+
+    @property
+    def stats(self):
+        return {'computed': self.computed, 'reused': self.reused}
+
+    def _memo(self, key, f):
+        if key in self._cache:
+            self.reused += 1
+        else:
+            self._cache[key] = f()
+            self.computed += 1
+        return self._cache[key]
+
+    def _panel(self):
+        if self.panel is None:
+            if isinstance(self.data, pd.DataFrame):
+                index = self.data.index
+            else:
+                index = next(iter(self.data.values())).index
+            self.panel = PanelIndex(index, self.group, self.date, self.period)
+        return self.panel
+
+    def col(self, name):
+        if name in self.derived:
+            return self.derived[name]
+        return self.data[name]
+
+    def derive(self, name, f):
+        """Register (once) a derived term that LAG/DIF can refer to by name."""
+        self.derived[name] = self._memo(('derive', name), f)
+        return self.derived[name]
+
+    def lag(self, name, n=1):
+        return self._memo(('lag', name, n),
+                          lambda: self._panel().lag(self.col(name), n))
+
+    def dif(self, name, n=1):
+        return self._memo(('dif', name, n),
+                          lambda: self.col(name) - self.lag(name, n))
+
+    def compute(self, names):
+        unknown = [name for name in names if name not in ANOMALIES]
+        if unknown:
+            raise ValueError('Unknown anomalies: {0}. Choose from {1}.'.format(
+                ', '.join(unknown), ', '.join(sorted(ANOMALIES))))
+
+        return pd.DataFrame(dict((name, ANOMALIES[name](self))
+                                 for name in names), columns=list(names))
+
+def _nsi(p):
+    # NSI = DIF( LOG(CSHO*AJEX) )
+    p.derive('si', lambda: log(p.col('csho')*p.col('ajex')))
+    return p.dif('si')
+
+def _tac(p):
+    ACC = ((p.dif('act') - p.dif('che'))
+           - (p.dif('lct') - p.dif('dlc') - p.dif('txp')) - p.col('dp'))
+    AT_AVG = (p.col('at') + p.lag('at'))/2
+    return ACC/AT_AVG
+
+def _noa(p):
+    AT = p.col('at')
+    OA = ( (AT - p.col('che')) - (AT - p.col('dlc') - p.col('dltt')
+            - p.col('mib') - p.col('pstk') - p.col('ceq')) )
+    return OA/p.lag('at')
+
+def _gpa(p):
+    return p.col('gp')/p.col('at')
+
+def _ag(p):
+    return p.col('at')/p.lag('at') - 1
+
+def _ia(p):
+    return ( p.dif('ppegt') + p.dif('invt') ) / p.lag('at')
+
+def _roa(p):
+    return p.col('ib')/p.col('at')
+
+def _oscore(p):
+    AT, NI = p.col('at'), p.col('ni')
+    DEBT = p.derive('debt',
+                    lambda: COALESCE(p.col('dltt')+p.col('dlc'), [p.col('lt')]))
+    INTWO = (p.lag('ni') < 0) & (p.lag('ni',2) < 0)
+    OENEG = (p.col('seq') < 0)
+    # Should divide AT by GDP Deflator
+    return -1.32 - 0.407*log(AT) \
+          + 6.03*DEBT/AT - 1.43*p.col('wcap')/AT \
+          + 0.076*p.col('lct')/p.col('act') - 2.37*NI/AT \
+          - 1.83*p.col('ebitda')/DEBT \
+          + 0.285*INTWO - 1.72*OENEG \
+          - 0.521*p.dif('ni')/(abs(NI)+abs(p.lag('ni')))
+
+def _roaq(p):
+    return p.col('ibq')/p.lag('atq')
+
+ANOMALIES = {
+    'nsi': _nsi,
+    'tac': _tac,
+    'noa': _noa,
+    'gpa': _gpa,
+    'ag': _ag,
+    'ia': _ia,
+    'roa': _roa,
+    'oscore': _oscore,
+    'roaq': _roaq,
+}
+
+def compute_anomalies(df, names=None, group='gvkey', date='date', period=None,
+                      return_plan=False):
+    """Computes several anomalies from one FUNDA/FUNDQ frame.
+
+        Parameters
+        ----------
+        df: pandas.DataFrame
+            e.g. FUNDAQuery(...).read_frame(), indexed by (gvkey, date)
+        names: list of str, default all annual anomalies
+            keys of comp.ANOMALIES, e.g. ['nsi','tac','noa','ag','ia']
+        group, date, period:
+            passed to util.PanelIndex
+        return_plan: bool, default False
+            also return the AnomalyPlan, whose stats are the counts of
+            intermediates computed and reused
+
+        Returns
+        -------
+        pandas.DataFrame with one column per anomaly, or
+        (DataFrame, AnomalyPlan) with return_plan=True
+
+    """
+    if names is None:
+        names = ['nsi', 'tac', 'noa', 'gpa', 'ag', 'ia', 'roa', 'oscore']
+    plan = AnomalyPlan(df, group, date, period)
+    anomalies = plan.compute(names)
+    logging.info('compute_anomalies: {0} intermediates computed, '
+                 '{1} reused.'.format(plan.computed, plan.reused))
+    if return_plan:
+        return anomalies, plan
+    return anomalies
+
 def NSI(CSHO, AJEX):
-    SI = log(CSHO*AJEX)
-    return pd.Series(DIF(SI), name='nsi')
+    p = AnomalyPlan({'csho': CSHO, 'ajex': AJEX})
+    return pd.Series(_nsi(p), name='nsi')
 
 def TAC(ACT, CHE, LCT, DLC, TXP, DP, AT):
-    ACC = ((DIF(ACT) - DIF(CHE)) - (DIF(LCT) - DIF(DLC) - DIF(TXP)) - DP)
-    AT_AVG = AT.groupby(level='gvkey').apply(lambda x: (x+x.shift(1))/2)
-    return pd.Series(ACC/AT_AVG, name='tac')
+    p = AnomalyPlan({'act': ACT, 'che': CHE, 'lct': LCT, 'dlc': DLC,
+                     'txp': TXP, 'dp': DP, 'at': AT})
+    return pd.Series(_tac(p), name='tac')
 
 def NOA(AT, CHE, DLC, DLTT, MIB, PSTK, CEQ):
-    OA = ( (AT - CHE) - (AT - DLC - DLTT - MIB - PSTK - CEQ) )
-    return pd.Series(OA/LAG(AT), name='noa')
+    p = AnomalyPlan({'at': AT, 'che': CHE, 'dlc': DLC, 'dltt': DLTT,
+                     'mib': MIB, 'pstk': PSTK, 'ceq': CEQ})
+    return pd.Series(_noa(p), name='noa')
 
 def GPA(GP, AT):
     return pd.Series(GP/AT, name='gpa')
 
 def AG(AT):
-    return pd.Series(AT/LAG(AT) - 1, name='ag')
+    return pd.Series(_ag(AnomalyPlan({'at': AT})), name='ag')
 
 def IA(PPEGT, INVT, AT):
-    return pd.Series( ( DIF(PPEGT) + DIF(INVT) ) / LAG(AT) , name='ia')
+    p = AnomalyPlan({'ppegt': PPEGT, 'invt': INVT, 'at': AT})
+    return pd.Series(_ia(p), name='ia')
 
 def ROA(IB, AT):
     return pd.Series(IB/AT, name='roa')
 
 def OSCORE(AT, DLTT, DLC, LT, LCT, ACT, NI, SEQ, WCAP, EBITDA):
-    INTWO = (LAG(NI) < 0) & (LAG(NI,2) < 0)
-    OENEG = (SEQ < 0)
-    # Should divide AT by GDP Deflator
-    OS = -1.32 - 0.407*log(AT) \
-          + 6.03*COALESCE(DLTT+DLC,[LT])/AT - 1.43*WCAP/AT \
-          + 0.076*LCT/ACT - 2.37*NI/AT - 1.83*EBITDA/COALESCE(DLTT+DLC,[LT]) \
-          + 0.285*INTWO - 1.72*OENEG - 0.521*DIF(NI)/(abs(NI)+abs(LAG(NI)))
-    return pd.Series(OS, name='oscore')
+    p = AnomalyPlan({'at': AT, 'dltt': DLTT, 'dlc': DLC, 'lt': LT,
+                     'lct': LCT, 'act': ACT, 'ni': NI, 'seq': SEQ,
+                     'wcap': WCAP, 'ebitda': EBITDA})
+    return pd.Series(_oscore(p), name='oscore')
 
 def ROAQ(IBQ, ATQ):
-    return pd.Series(IBQ/LAG(ATQ), name='roaq')
+    return pd.Series(_roaq(AnomalyPlan({'ibq': IBQ, 'atq': ATQ})), name='roaq')
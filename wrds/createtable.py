@@ -1,36 +1,65 @@
-from sqlalchemy.sql import Select
+import sqlalchemy as sa
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.expression import ClauseElement, Select
 from sqlalchemy.ext.compiler import compiles
 
+# bookkeeping for WRDSQuery.create_table builds
+build_log = sa.Table('wrds_build_log', sa.MetaData(),
+                     sa.Column('table_name', sa.String(255), nullable=False),
+                     sa.Column('mode', sa.String(16)),
+                     sa.Column('built_at', sa.DateTime),
+                     sa.Column('high_water', sa.Date),
+                     sa.Column('rows', sa.Integer))
 
-class CreateTableAs(Select):
-    """Create a CREATE TABLE AS SELECT ... statement."""
+def last_build(conn, table_name):
+    """High-water date of the last recorded build of `table_name`."""
+    if not conn.dialect.has_table(conn, build_log.name):
+        return None
+    return conn.execute(sa.select([build_log.c.high_water]).
+                        where(build_log.c.table_name == table_name).
+                        order_by(build_log.c.built_at.desc()).
+                        limit(1)).scalar()
 
-    def __init__(self, columns, new_table_name='', is_temporary=False,
-            on_commit_delete_rows=False, on_commit_drop=False, *arg, **kw):
+
+class CreateTableAs(Executable, ClauseElement):
+    """Create a CREATE TABLE AS SELECT ... statement.
+
+    Wraps a select() rather than subclassing Select, whose constructor
+    differs between SQLAlchemy 1.3 and 1.4. It is compiled by the statement
+    compiler, so bound parameters of the select (dates, IN lists) are passed
+    to the driver as usual.
+    """
+
+    inherit_cache = False
+    _execution_options = Executable._execution_options.union(
+        {'autocommit': True})
+
+    def __init__(self, select, new_table_name='', is_temporary=False,
+            on_commit_delete_rows=False, on_commit_drop=False):
         """By default the table sticks around after the transaction. You can
         change this behavior using the `on_commit_delete_rows` or
         `on_commit_drop` arguments.
 
+        :param select: the query, or the columns to select
         :param on_commit_delete_rows: All rows in the temporary table will be
         deleted at the end of each transaction block.
         :param on_commit_drop: The temporary table will be dropped at the end
         of the transaction block.
         """
-        super(CreateTableAs, self).__init__(columns, *arg, **kw)
-
+        if not isinstance(select, Select):
+            select = sa.select(list(select))
+        self.select = select
         self.is_temporary = is_temporary
         self.new_table_name = new_table_name
         self.on_commit_delete_rows = on_commit_delete_rows
         self.on_commit_drop = on_commit_drop
-        self.select = None
 
 
 @compiles(CreateTableAs)
 def s_create_table_as(element, compiler, **kw):
     """Compile the statement."""
-    text = compiler.visit_select(element)
-
-    spec = ['CREATE', 'TABLE', element.new_table_name, 'AS SELECT']
+    spec = ['CREATE', 'TABLE',
+            compiler.preparer.quote(element.new_table_name)]
 
     if element.is_temporary:
         spec.insert(1, 'TEMPORARY')
@@ -42,9 +71,10 @@ def s_create_table_as(element, compiler, **kw):
     elif element.on_commit_drop:
         on_commit = 'ON COMMIT DROP'
 
-    if on_commit:
-        spec.insert(len(spec)-1, on_commit)
+    # ON COMMIT is PostgreSQL syntax; embedded engines keep temporary tables
+    # until the connection closes
+    if on_commit and compiler.dialect.name == 'postgresql':
+        spec.append(on_commit)
 
-    # replace the outermost select statement
-    text = text.replace('SELECT', ' '.join(spec), 1)
-    return text
+    spec += ['AS', compiler.process(element.select, **kw)]
+    return ' '.join(spec)
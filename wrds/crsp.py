@@ -1,7 +1,6 @@
 import pandas as pd
 import numpy as np
 from .util import *
-import statsmodels as sm
 
 # CRSP Convenience Functions
 
@@ -11,32 +10,205 @@ from numpy.ma import masked_array
 def compound_ret(ret):
     return exp(sum(log(1+ret)))-1
 
+# Daily to monthly aggregation
+
+# partial sums per permno-month, mergeable across chunks
+_PARTIALS = {'ndays': 'sum', 'n': 'sum', 'logret': 'sum', 'wiped': 'sum',
+             'sum': 'sum', 'sumsq': 'sum', 'maxret': 'max'}
+
+def _month_partials(df, ret):
+    r = df[ret].astype('float64').values
+    # ret == -1 has no finite log; count those days instead
+    wiped = r <= -1
+    dates = df.index.get_level_values('date').values.astype('datetime64[M]')
+    parts = pd.DataFrame({'permno': df.index.get_level_values('permno'),
+                          'month': dates,
+                          'ndays': 1,
+                          'n': ~np.isnan(r),
+                          'logret': np.log1p(np.where(wiped, 0, r)),
+                          'wiped': wiped,
+                          'sum': r,
+                          'sumsq': r*r,
+                          'maxret': r})
+    return parts.groupby(['permno', 'month'], sort=False).agg(_PARTIALS)
+
+def _month_stats(parts):
+    n = parts['n']
+    var = (parts['sumsq'] - parts['sum']**2/n)/(n-1)
+    ret = np.expm1(parts['logret']).where(parts['wiped'] == 0, -1.)
+    out = pd.DataFrame({'ret': ret.where(n > 0),
+                        'rvol': np.sqrt(var.clip(lower=0).where(n > 1)),
+                        'ndays': parts['ndays'].astype('int16'),
+                        'maxret': parts['maxret']})
+    permno, month = [parts.index.get_level_values(i) for i in (0, 1)]
+    # label months by their last calendar day
+    date = (month.values.astype('datetime64[M]') + 1).astype('datetime64[D]') \
+        - np.timedelta64(1, 'D')
+    out.index = pd.MultiIndex.from_arrays([permno, pd.DatetimeIndex(date)],
+                                          names=['permno', 'date'])
+    return out
+
+def daily_to_monthly(chunks, ret='ret'):
+    """Aggregates daily returns to permno-months, one chunk at a time.
+
+        Parameters
+        ----------
+        chunks: iterable of DataFrames indexed by (permno, date) and ordered
+            by permno, date across chunks, e.g. CRSPQuery(freq='dsf')
+            .read_frame(chunksize=..., order_by=['permno', 'date'])
+        ret: daily return column (default: 'ret')
+
+        Yields
+        ------
+        DataFrames of completed permno-months with the compounded return
+        (ret), realized volatility as the standard deviation of daily
+        returns (rvol), trading days (ndays) and max daily return (maxret).
+        Only the month that may continue into the next chunk is carried.
+
+    """
+    carry = None
+    for df in chunks:
+        if not len(df):
+            continue
+        parts = _month_partials(df, ret)
+        if carry is not None:
+            parts = pd.concat([carry, parts]).groupby(level=[0, 1],
+                sort=False).agg(_PARTIALS)
+        carry = parts.iloc[-1:]
+        if len(parts) > 1:
+            yield _month_stats(parts.iloc[:-1])
+    if carry is not None:
+        yield _month_stats(carry)
+
+def monthly_dsf(query, chunksize='256MB', ret='ret', **kwargs):
+    """Monthly aggregates of a CRSPQuery(freq='dsf') in bounded memory.
+
+        The daily rows are read with a server-side cursor in chunks of
+        `chunksize` (rows or a memory budget), ordered by permno and date,
+        and reduced by daily_to_monthly; other options go to read_frame.
+
+    """
+    chunks = query.read_frame(chunksize=chunksize, stream=True,
+                              order_by=['permno', 'date'], **kwargs)
+    months = list(daily_to_monthly(chunks, ret))
+    if not months:
+        return pd.DataFrame(columns=['ret', 'rvol', 'ndays', 'maxret'])
+    return pd.concat(months)
+
 # useful for computing ivol
 def rmse(data, yvar, xvars):
-    raise NotImplementedError('No dsf support yet.')
-    Y = data[yvar]
-    X = data[xvars]
-    X['intercept'] = 1.
-    result = sm.OLS(Y, X).fit()
-    return pd.Series({'ivol':sqrt(result.mse_resid), 'n':result.nobs})
-
-def MOM(ret, n=11):
-    grp = ret.groupby(level='permno')
-    return pd.Series(grp.apply(pd.rolling_apply,n,
-                     lambda x: np.prod(1 + x) - 1),
-                     name='mom_{0}'.format(n+1))
-
-def VOL(ret, days=60):
-    raise NotImplementedError('No dsf support yet.')
-
-def BAB(ret):
-    raise NotImplementedError('No dsf support yet.')
-
-def CEI(ret, me, n=60):
+    """Residual standard deviation of one OLS of yvar on xvars.
+
+    For every firm-window at once use rolling_ols (see VOL).
+    """
+    data = data[[yvar] + list(xvars)].dropna()
+    Y = data[yvar].values
+    X = np.column_stack([data[xvars].values, np.ones(len(data))])
+    coef, ssr, rank, _ = np.linalg.lstsq(X, Y, rcond=None)
+    resid = Y - X.dot(coef)
+    dof = len(data) - rank
+    ivol = np.sqrt(resid.dot(resid)/dof) if dof > 0 else np.nan
+    return pd.Series({'ivol': ivol, 'n': len(data)})
+
+def _mom_name(n, skip):
+    if skip:
+        return 'mom_{0}_{1}'.format(n+skip, skip+1)
+    return 'mom_{0}'.format(n+1)
+
+def _cumret(panel, ret, n, skip, min_obs):
+    """Compounded return over each row's window, from summed log returns."""
+    ret = ret.astype(float)
+    # ret == -1 has no finite log; any such month wipes out the window
+    wiped = ret <= -1
+    logret = np.log1p(ret.where(~wiped, 0))
+    cum = np.expm1(panel.rolling_sum(logret, n, skip, min_obs))
+    wiped = panel.rolling_sum(wiped.astype(float).where(ret.notnull()),
+                              n, skip, 1) > 0
+    return cum.where(~wiped | cum.isnull(), -1.)
+
+def MOM(ret, n=11, skip=0, min_obs=None, group='permno', date='date',
+        period=1):
+    """Compounded return over the n months ending `skip` months back.
+
+        Parameters
+        ----------
+        ret: Series of monthly returns indexed by (permno, date)
+        n: months in the window (default: 11, i.e. t-10 to t)
+        skip: most recent months left out, e.g. n=11, skip=1 for 12-2
+            momentum (default: 0)
+        min_obs: non-missing returns required (default: n)
+        period: months between observations; windows are measured in
+            calendar time, so gaps are not bridged (None: count rows)
+
+    """
+    panel = PanelIndex(ret.index, group, date, period)
+    return pd.Series(_cumret(panel, ret, n, skip, min_obs).values,
+                     index=ret.index, name=_mom_name(n, skip))
+
+def momentum(ret, horizons=((11, 0), (11, 1), (5, 1), (35, 12)),
+             min_obs=None, group='permno', date='date', period=1):
+    """MOM for several (n, skip) horizons, sharing one sort of the panel.
+
+        Returns a DataFrame with one column per horizon (see MOM).
+    """
+    panel = PanelIndex(ret.index, group, date, period)
+    return pd.DataFrame(dict((_mom_name(n, skip),
+                              _cumret(panel, ret, n, skip, min_obs).values)
+                             for n, skip in horizons),
+                        index=ret.index,
+                        columns=[_mom_name(n, skip) for n, skip in horizons])
+
+def _market(ret, date='date'):
+    # equal-weighted cross-sectional mean, when no market series is given
+    return ret.groupby(level=date).mean().rename('mkt')
+
+def VOL(ret, days=60, factors=None, min_obs=None, group='permno',
+        date='date'):
+    """Idiosyncratic volatility over the trailing `days` daily returns.
+
+        Parameters
+        ----------
+        ret: daily returns indexed by (permno, date), ordered by date
+        factors: DataFrame/Series of daily factor or market returns indexed
+            by date, in the units of ret (ff.factors_df is in percent).
+            Default: the equal-weighted mean of ret.
+        min_obs: returns required per window (default: days)
+
+    """
+    if factors is None:
+        factors = _market(ret, date)
+    res = rolling_ols(ret, factors, days, min_obs, group, date)
+    return pd.Series(res['ivol'].values, index=ret.index, name='ivol')
+
+def BAB(ret, mkt=None, days=252, min_obs=None, shrink=0.6, group='permno',
+        date='date'):
+    """Market beta for betting-against-beta sorts.
+
+        The time-series beta on the trailing `days` daily returns is shrunk
+        toward one, shrink*beta + (1-shrink), as in Frazzini and Pedersen
+        (2014). `mkt` defaults to the equal-weighted mean of ret.
+    """
+    if mkt is None:
+        mkt = _market(ret, date)
+    if isinstance(mkt, pd.DataFrame):
+        mkt = mkt.iloc[:, 0]
+    res = rolling_ols(ret, mkt.rename('mkt'), days, min_obs, group, date)
+    return pd.Series(shrink*res['beta_mkt'].values + (1-shrink),
+                     index=ret.index, name='bab_beta')
+
+def CEI(ret, me, n=60, group='permno', date='date', period=1):
+    """Composite equity issuance (Daniel and Titman, 2006).
+
+        The log growth of me over the n months to t, less the log
+        compounded return over the n months ending at t-1: the part of the
+        growth in market equity not due to returns. Missing returns count
+        as zero; windows are measured in calendar months (see MOM).
+    """
     ret = ret.fillna(0)
-    BR = exp(DIF(log(me),n,group='permno'))
-    LR = LAG(MOM(ret,n),group='permno')
+    panel = PanelIndex(ret.index, group, date, period)
+    BR = panel.dif(log(me), n)
+    LR = np.log1p(_cumret(panel, ret, n, 1, n))
 
-    return pd.Series(log(BR) - log(LR), name='cei')
+    return pd.Series(BR - LR, name='cei')
 
 
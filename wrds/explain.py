@@ -0,0 +1,480 @@
+"""Query plans of WRDSQuery statements and slow-query diagnostics.
+
+plan(engine, query) runs EXPLAIN on a SQLAlchemy selectable and returns a
+Plan: a tree of PlanNode objects and the problems found in it. PostgreSQL
+plans come from EXPLAIN (FORMAT JSON[, ANALYZE, BUFFERS]); SQLite's EXPLAIN
+QUERY PLAN (no costs or row estimates) and DuckDB's JSON plans are parsed
+too. Problems flagged:
+
+    seq_scan        full scan of a table with at least `large_rows` rows
+                    (not on DuckDB, where columnar scans are the norm)
+    extract_join    join condition applying extract()/date_part() etc. to a
+                    column, which no plain index on the column can serve
+    nested_loop     nested loop doing at least `loop_rows` outer x inner rows
+    misestimate     actual rows `misestimate` times off the estimate, at the
+                    node where the error starts (ANALYZE only)
+    spill           sort, hash or aggregate written to disk (ANALYZE only)
+
+auto_explain(seconds) captures and logs the plan of every read_frame that
+takes longer than `seconds` (also set by ``WRDS_AUTO_EXPLAIN=seconds``).
+"""
+import os
+import json
+import logging
+from collections import deque
+from timeit import default_timer
+
+import sqlalchemy as sa
+from sqlalchemy.sql import visitors, expression
+from sqlalchemy.ext.compiler import compiles
+
+from . import profile
+from .cache import source_tables
+
+LARGE_ROWS = 1000000
+LOOP_ROWS = 10000000
+MISESTIMATE = 10.
+# misestimates below this many rows are not worth reporting
+MIN_ROWS = 1000
+
+# functions that hide a join column from its indexes
+NON_SARGABLE = ('extract', 'date_part', 'date_trunc', 'strftime', 'to_char')
+
+class PlanNode(object):
+    """One operator of a query plan.
+
+       rows and actual_rows are per loop, as PostgreSQL reports them; seconds
+       is the actual time including children (ANALYZE only).
+    """
+
+    def __init__(self, node_type, table=None, alias=None, rows=None,
+                 actual_rows=None, loops=1, cost=None, seconds=None,
+                 detail=None, children=None):
+        self.node_type = node_type
+        self.table = table
+        self.alias = alias
+        self.rows = rows
+        self.actual_rows = actual_rows
+        self.loops = loops or 1
+        self.cost = cost
+        self.seconds = seconds
+        self.detail = detail or {}
+        self.children = children or []
+
+    def walk(self):
+        """This node and all nodes below it, depth first."""
+        yield self
+        for child in self.children:
+            for node in child.walk():
+                yield node
+
+    @property
+    def total_rows(self):
+        """Rows produced over all loops (actual if known)."""
+        rows = self.rows if self.actual_rows is None else self.actual_rows
+        return None if rows is None else rows*self.loops
+
+    def label(self):
+        # SQLite nodes are labelled with their EXPLAIN QUERY PLAN line
+        text = self.detail.get('detail', self.node_type)
+        if self.table and 'detail' not in self.detail:
+            text += ' on {0}'.format(self.table)
+            if self.alias and self.alias != self.table:
+                text += ' {0}'.format(self.alias)
+        info = []
+        if self.cost is not None:
+            info.append('cost={0:.0f}'.format(self.cost))
+        if self.rows is not None:
+            info.append('rows={0:.0f}'.format(self.rows))
+        if self.actual_rows is not None:
+            info.append('actual={0:.0f}'.format(self.actual_rows))
+        if self.loops > 1:
+            info.append('loops={0}'.format(self.loops))
+        if self.seconds is not None:
+            info.append('{0:.3f}s'.format(self.seconds))
+        return text + ('  ({0})'.format(' '.join(info)) if info else '')
+
+    def __repr__(self):
+        return 'PlanNode({0})'.format(self.label())
+
+class Problem(object):
+    """A likely cause of a slow plan; node is None for statement-level ones."""
+
+    def __init__(self, kind, message, node=None):
+        self.kind = kind
+        self.message = message
+        self.node = node
+
+    def __repr__(self):
+        return '{0}: {1}'.format(self.kind, self.message)
+
+class Plan(object):
+    """Parsed plan of one statement with the problems found in it."""
+
+    def __init__(self, dialect, root, analyze=False, raw=None,
+                 planning_seconds=None, execution_seconds=None):
+        self.dialect = dialect
+        self.root = root
+        self.analyze = analyze
+        self.raw = raw
+        self.planning_seconds = planning_seconds
+        self.execution_seconds = execution_seconds
+        self.problems = []
+
+    def nodes(self):
+        return list(self.root.walk())
+
+    def text(self):
+        """Indented plan tree followed by the problems."""
+        lines = []
+        def add(node, depth):
+            lines.append('{0}{1}{2}'.format('   '*depth,
+                                            '-> ' if depth else '',
+                                            node.label()))
+            for child in node.children:
+                add(child, depth + 1)
+        add(self.root, 0)
+        if self.planning_seconds is not None:
+            lines.append('Planning: {0:.3f}s'.format(self.planning_seconds))
+        if self.execution_seconds is not None:
+            lines.append('Execution: {0:.3f}s'.format(self.execution_seconds))
+        if self.problems:
+            lines.append('Problems:')
+            lines += ['  {0!r}'.format(p) for p in self.problems]
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.text()
+
+    def __repr__(self):
+        return 'Plan({0}, {1} nodes, problems: {2})'.format(
+            self.dialect, len(self.nodes()),
+            ', '.join(p.kind for p in self.problems) or 'none')
+
+def plan(engine, query, analyze=False, buffers=True, large_rows=LARGE_ROWS,
+         loop_rows=LOOP_ROWS, misestimate=MISESTIMATE):
+    """EXPLAINs `query` on `engine` and checks the plan for problems.
+
+       Parameters
+       ----------
+       analyze: run the statement for actual rows, times and spills
+           (default: False). On SQLite the statement is only timed.
+       buffers: include buffer usage with analyze on PostgreSQL
+           (default: True)
+       large_rows: table size from which a full scan is flagged
+       loop_rows: outer x inner rows from which a nested loop is flagged
+       misestimate: actual/estimated row ratio (either way) flagged
+
+       Returns
+       -------
+       Plan
+
+    """
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        options = ['FORMAT JSON']
+        if analyze:
+            options += ['ANALYZE'] + (['BUFFERS'] if buffers else [])
+        raw = engine.execute(Explain(query, ', '.join(options))).scalar()
+        if not isinstance(raw, list):
+            raw = json.loads(raw)
+        result = _pg_plan(raw[0], analyze)
+    elif dialect == 'duckdb':
+        options = 'ANALYZE, FORMAT JSON' if analyze else 'FORMAT JSON'
+        raw = json.loads(engine.execute(Explain(query, options)).fetchone()[1])
+        result = _duckdb_plan(raw, analyze)
+    elif dialect == 'sqlite':
+        rows = engine.execute(Explain(query, None)).fetchall()
+        result = _sqlite_plan(rows, _aliases(query))
+        if analyze:
+            start = default_timer()
+            res = engine.execute(query)
+            n = sum(len(chunk) for chunk in
+                    iter(lambda: res.fetchmany(100000), []))
+            result.execution_seconds = default_timer() - start
+            result.root.actual_rows = n
+            result.analyze = True
+    else:
+        raise ValueError('explain supports PostgreSQL, SQLite and DuckDB, '
+                         'not {0}.'.format(dialect))
+
+    sizes = table_rows(engine, source_tables(query))
+    result.problems += _extract_joins(query, engine.dialect)
+    result.problems += _check(result, sizes, large_rows, loop_rows,
+                              misestimate)
+    return result
+
+class Explain(expression.Executable, expression.ClauseElement):
+    """EXPLAIN (options) query; EXPLAIN QUERY PLAN query on SQLite."""
+
+    inherit_cache = False
+
+    def __init__(self, query, options=None):
+        self.query = query
+        self.options = options
+
+@compiles(Explain)
+def s_explain(element, compiler, **kw):
+    prefix = 'EXPLAIN'
+    if compiler.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN'
+    elif element.options:
+        prefix = 'EXPLAIN ({0})'.format(element.options)
+    return '{0} {1}'.format(prefix, compiler.process(element.query, **kw))
+
+def table_rows(engine, tables):
+    """Estimated rows of each table in `tables` (missing when unknown).
+
+       Uses the planner statistics on PostgreSQL (pg_class.reltuples), the
+       largest rowid on SQLite and duckdb_tables() on DuckDB.
+    """
+    tables = list(tables)
+    if not tables:
+        return {}
+    dialect = engine.dialect.name
+    sizes = {}
+    try:
+        if dialect == 'postgresql':
+            pg_class = sa.sql.table('pg_class', sa.sql.column('relname'),
+                                    sa.sql.column('reltuples'),
+                                    sa.sql.column('relkind'))
+            rows = engine.execute(sa.select([pg_class.c.relname,
+                                             pg_class.c.reltuples]).
+                                  where(pg_class.c.relname.in_(tables)).
+                                  where(pg_class.c.relkind.in_(['r', 'p'])))
+            for name, n in rows:
+                if n is not None and n >= 0:
+                    sizes[name] = max(sizes.get(name, 0), int(n))
+        elif dialect == 'sqlite':
+            quote = engine.dialect.identifier_preparer.quote
+            for name in tables:
+                n = engine.execute('SELECT max(rowid) FROM {0}'.format(
+                    quote(name))).scalar()
+                if n is not None:
+                    sizes[name] = int(n)
+        elif dialect == 'duckdb':
+            rows = engine.execute('SELECT table_name, estimated_size '
+                                  'FROM duckdb_tables()')
+            sizes = dict((name, int(n)) for name, n in rows
+                         if name in tables and n is not None)
+    except sa.exc.DBAPIError:
+        logging.warning('Cannot read table sizes.', exc_info=True)
+    return sizes
+
+# parsers
+
+def _pg_node(d):
+    seconds = d.get('Actual Total Time')
+    return PlanNode(d['Node Type'], table=d.get('Relation Name'),
+                    alias=d.get('Alias'), rows=d.get('Plan Rows'),
+                    actual_rows=d.get('Actual Rows'),
+                    loops=d.get('Actual Loops', 1), cost=d.get('Total Cost'),
+                    seconds=None if seconds is None else seconds/1000.,
+                    detail=dict((k, v) for k, v in d.items() if k != 'Plans'),
+                    children=[_pg_node(p) for p in d.get('Plans', [])])
+
+def _pg_plan(raw, analyze):
+    ms = lambda key: None if key not in raw else raw[key]/1000.
+    return Plan('postgresql', _pg_node(raw['Plan']), analyze, raw,
+                ms('Planning Time'), ms('Execution Time'))
+
+def _duckdb_node(d):
+    extra = d.get('extra_info') or {}
+    rows = extra.get('Estimated Cardinality')
+    return PlanNode((d.get('operator_name') or d.get('name', '')).strip(),
+                    table=extra.get('Table'),
+                    rows=None if rows is None else float(rows),
+                    actual_rows=d.get('operator_cardinality'),
+                    seconds=d.get('operator_timing'), detail=extra,
+                    children=[_duckdb_node(c) for c in d.get('children', [])])
+
+def _duckdb_plan(raw, analyze):
+    if isinstance(raw, list):
+        root = raw[0]
+    else:
+        # the profile of EXPLAIN ANALYZE wraps the plan in an
+        # EXPLAIN_ANALYZE operator
+        root = raw
+        while (root.get('operator_type') in (None, 'EXPLAIN_ANALYZE')
+               and len(root.get('children', [])) == 1):
+            root = root['children'][0]
+    result = Plan('duckdb', _duckdb_node(root), analyze, raw,
+                  execution_seconds=raw.get('latency')
+                  if isinstance(raw, dict) else None)
+    if isinstance(raw, dict) and raw.get('system_peak_temp_dir_size', 0) > 0:
+        result.problems.append(Problem('spill', '{0:.1f} MB written to the '
+            'temporary directory'.format(
+                raw['system_peak_temp_dir_size']/2.**20), result.root))
+    return result
+
+def _sqlite_plan(rows, aliases):
+    root = PlanNode('QUERY PLAN')
+    nodes = {0: root}
+    for row in rows:
+        id, parent, detail = row[0], row[1], row[-1]
+        words = detail.split()
+        table = alias = None
+        if words[0] in ('SCAN', 'SEARCH') and len(words) > 1:
+            rest = words[1:]
+            if rest[0] == 'TABLE' and len(rest) > 1:
+                rest = rest[1:]
+            alias = rest[2] if len(rest) > 2 and rest[1] == 'AS' else rest[0]
+            table = aliases.get(alias, rest[0])
+        node = PlanNode(words[0] if table else detail, table=table,
+                        alias=alias, detail={'detail': detail})
+        nodes[id] = node
+        nodes.get(parent, root).children.append(node)
+    return Plan('sqlite', root, raw=[tuple(r) for r in rows])
+
+def _aliases(query):
+    """Alias name -> table name for the aliased tables in `query`."""
+    aliases = {}
+    for el in visitors.iterate(query, {}):
+        if (isinstance(el, expression.Alias)
+                and isinstance(el.element, sa.Table)):
+            aliases[el.name] = el.element.name
+    return aliases
+
+# checks
+
+def _extract_joins(query, dialect):
+    problems = []
+    for join in visitors.iterate(query, {}):
+        if not isinstance(join, expression.Join) or join.onclause is None:
+            continue
+        for el in visitors.iterate(join.onclause, {}):
+            name = getattr(el, 'name', None)
+            if (isinstance(el, expression.Extract) or
+                    (isinstance(el, expression.FunctionElement) and
+                     str(name).lower() in NON_SARGABLE)):
+                condition = ' '.join(str(join.onclause.compile(
+                    dialect=dialect)).split())
+                problems.append(Problem('extract_join',
+                    'join on {0} cannot use an index on the column: '
+                    '{1}'.format('extract()' if name is None else
+                                 name + '()', condition[:200])))
+                break
+    return problems
+
+_FULL_SCANS = ('Seq Scan', 'SCAN')
+_NESTED_LOOPS = ('Nested Loop', 'NESTED_LOOP_JOIN', 'BLOCKWISE_NL_JOIN',
+                 'CROSS_PRODUCT')
+
+def _scan_rows(node, sizes):
+    """Rows a scan reads per loop: the table size for full scans."""
+    while node.node_type in ('Materialize', 'Memoize') and node.children:
+        node = node.children[0]
+    rows = node.rows if node.actual_rows is None else node.actual_rows
+    if node.node_type in _FULL_SCANS:
+        rows = max(rows or 0, sizes.get(node.table, 0))
+    return rows
+
+def _check(result, sizes, large_rows, loop_rows, misestimate):
+    problems = []
+    name = lambda n: n.table or n.alias or n.node_type
+    for node in result.root.walk():
+        # full scans of big tables
+        if (result.dialect != 'duckdb' and node.node_type in _FULL_SCANS
+                and sizes.get(node.table, 0) >= large_rows):
+            problems.append(Problem('seq_scan', 'full scan of {0} '
+                '({1:,} rows)'.format(name(node), sizes[node.table]), node))
+
+        # nested loops: PostgreSQL/DuckDB operators, SQLite loop nests
+        if node.node_type in _NESTED_LOOPS and len(node.children) == 2:
+            outer, inner = node.children
+            work = (outer.total_rows or 0)*(_scan_rows(inner, sizes) or 0)
+            if work >= loop_rows:
+                problems.append(Problem('nested_loop', 'nested loop over '
+                    '{0} x {1} ({2:,.0f} rows)'.format(name(outer),
+                                                       name(inner), work),
+                    node))
+        if result.dialect == 'sqlite':
+            loops = [c for c in node.children
+                     if c.node_type in ('SCAN', 'SEARCH')]
+            for i, inner in enumerate(loops[1:], 1):
+                if inner.node_type != 'SCAN':
+                    continue
+                outer = max(sizes.get(c.table, 0) for c in loops[:i])
+                work = outer*sizes.get(inner.table, 0)
+                if work >= loop_rows:
+                    problems.append(Problem('nested_loop', 'full scan of {0} '
+                        'inside a loop over {1} ({2:,.0f} rows)'.format(
+                            name(inner), ', '.join(name(c)
+                                                   for c in loops[:i]),
+                            work), inner))
+
+        # where the row estimate first goes wrong
+        if (result.analyze and node.rows is not None
+                and node.actual_rows is not None):
+            ratio = _ratio(node)
+            worst = max(node.rows, node.actual_rows)*node.loops
+            if (ratio >= misestimate and worst >= MIN_ROWS and
+                    all(_ratio(c) < misestimate for c in node.children)):
+                problems.append(Problem('misestimate', '{0}: estimated {1:,.0f}'
+                    ' rows, got {2:,.0f}'.format(node.label().split('  (')[0],
+                                                node.rows, node.actual_rows),
+                    node))
+
+        # PostgreSQL spills
+        d = node.detail
+        if d.get('Sort Space Type') == 'Disk':
+            problems.append(Problem('spill', '{0} ({1}) used {2} kB on '
+                'disk'.format(node.node_type, d.get('Sort Method'),
+                              d.get('Sort Space Used')), node))
+        elif d.get('Hash Batches', 1) > 1:
+            problems.append(Problem('spill', 'Hash split into {0} batches '
+                '(work_mem too small for {1:,.0f} rows)'.format(
+                    d['Hash Batches'], node.total_rows or 0), node))
+        elif d.get('Disk Usage', 0) > 0:
+            problems.append(Problem('spill', '{0} used {1} kB on '
+                'disk'.format(node.node_type, d['Disk Usage']), node))
+    return problems
+
+def _ratio(node):
+    if node.rows is None or node.actual_rows is None:
+        return 1.
+    est, act = max(node.rows, 1.), max(node.actual_rows, 1.)
+    return max(est/act, act/est)
+
+# auto-explain
+
+class AutoExplain(object):
+    """profile hook capturing the plan of reads slower than `seconds`.
+
+       The plan is stored on the read's stats (``q.stats.plan``), logged as a
+       warning and kept in `plans` (the last `keep` slow reads).
+    """
+
+    def __init__(self, seconds, analyze=False, buffers=True, keep=20):
+        self.seconds = seconds
+        self.analyze = analyze
+        self.buffers = buffers
+        self.plans = deque(maxlen=keep)
+
+    def __call__(self, stats):
+        # cache hits never reach the database
+        source = getattr(stats, 'source', None)
+        if (source is None or stats.seconds < self.seconds
+                or not stats.stages['execute'].calls):
+            return
+        result = stats.plan = source.explain(analyze=self.analyze,
+                                             buffers=self.buffers)
+        self.plans.append((stats, result))
+        logging.warning('read_frame {0} took {1:.1f}s (auto_explain at '
+                        '{2}s):\n{3}'.format(stats.query, stats.seconds,
+                                             self.seconds, result.text()))
+
+def auto_explain(seconds, analyze=False, buffers=True):
+    """Explains every read_frame slower than `seconds`; None turns it off.
+
+       Returns the installed AutoExplain hook.
+    """
+    for hook in list(profile._hooks):
+        if isinstance(hook, AutoExplain):
+            profile.remove_hook(hook)
+    if seconds is None:
+        return None
+    return profile.add_hook(AutoExplain(seconds, analyze, buffers))
+
+if os.environ.get('WRDS_AUTO_EXPLAIN'):
+    auto_explain(float(os.environ['WRDS_AUTO_EXPLAIN']))
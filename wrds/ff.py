@@ -1,13 +1,192 @@
+"""Fama-French factors from a local store.
+
+Factor files downloaded from Ken French's data library (the *_CSV.zip
+archives, or the CSV files inside them) are read from the store directory
+(``WRDS_FF_DIR``, default ``~/.wrds/ff``). Each dataset is parsed once and
+kept next to its source as a pickle, which is re-parsed only when the source
+file is newer, and every parsed frame is memoized for the process:
+
+    mkt = wrds.ff.factors_df()                         # monthly FF3
+    ff5 = wrds.ff.factors_df(dataset='ff5', freq='D')  # daily FF5
+
+Only when a dataset has no local file is it fetched with pandas_datareader
+(and then stored, so later calls work offline). Returns are in percent.
+"""
+import io
+import os
+import re
+import logging
+import threading
+import zipfile
+
+import numpy as np
 import pandas as pd
-from pandas.io.data import DataReader
-import datetime as dt
 
-def factors_df(end=True):
-    ff = pd.DataFrame(DataReader("F-F_Research_Data_Factors", "famafrench")[0])
-    ff.columns = ['Mkt_rf', 'SMB', 'HML', 'rf']
+FF_DIR = os.environ.get('WRDS_FF_DIR', os.path.expanduser('~/.wrds/ff'))
+
+# (dataset, freq) -> data library file name
+DATASETS = {('ff3', 'M'): 'F-F_Research_Data_Factors',
+            ('ff3', 'D'): 'F-F_Research_Data_Factors_daily',
+            ('ff5', 'M'): 'F-F_Research_Data_5_Factors_2x3',
+            ('ff5', 'D'): 'F-F_Research_Data_5_Factors_2x3_daily',
+            ('mom', 'M'): 'F-F_Momentum_Factor',
+            ('mom', 'D'): 'F-F_Momentum_Factor_daily'}
+
+COLUMNS = {'Mkt-RF': 'Mkt_rf', 'RF': 'rf'}
+# missing-value codes in the data library files
+MISSING = [-99.99, -999.]
+
+_SUFFIXES = ['_CSV.zip', '.zip', '.CSV', '.csv']
+_HEADER = re.compile(r'^[ \t]*,.*$', re.M)
+# the first table ends at the first line not starting with a date
+_END = re.compile(r'^(?![ \t]*\d)', re.M)
+
+_memo = {}
+_lock = threading.Lock()
+
+def _read_source(path):
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as z:
+            data = z.read(z.namelist()[0])
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+    return data.decode('latin-1')
+
+def _dates(values, freq):
+    """Dates from YYYYMM or YYYYMMDD integers, without parsing strings."""
+    values = np.asarray(values, dtype=np.int64)
+    if freq == 'D':
+        ym, day = values // 100, values % 100
+    else:
+        ym, day = values, np.ones(len(values), dtype=np.int64)
+    months = (ym // 100 - 1970)*12 + ym % 100 - 1
+    days = months.astype('datetime64[M]').astype('datetime64[D]') + day - 1
+    return pd.DatetimeIndex(days.astype('datetime64[ns]'), name='date')
+
+def parse(text, freq='M'):
+    """First table (the monthly or daily factors) of a data library CSV."""
+    assert freq in ('M', 'D'), "Invalid freq: {0}".format(freq)
+    header = _HEADER.search(text)
+    if header is None:
+        raise ValueError('No factor table found.')
+    end = _END.search(text, header.end() + 1)
+    table = text[header.start():end.start() if end else len(text)]
+
+    df = pd.read_csv(io.StringIO(table), index_col=0)
+    df.columns = [COLUMNS.get(c.strip(), c.strip()) for c in df.columns]
+    df.index = _dates(df.index.values, freq)
+    return df.astype(float).mask(df.isin(MISSING))
+
+def _download(name, freq):
+    # only imported when a dataset is not in the store
+    from pandas_datareader.data import DataReader
+
+    logging.info('Downloading {0} from the Fama-French data library.'
+                 .format(name))
+    df = pd.DataFrame(DataReader(name, 'famafrench', start='1900')[0])
+    df.columns = [COLUMNS.get(c.strip(), c.strip()) for c in df.columns]
+    if isinstance(df.index, pd.PeriodIndex):
+        df.index = df.index.to_timestamp()
+    df.index = pd.DatetimeIndex(df.index, name='date')
+    return df.astype(float)
+
+class FactorStore(object):
+    """Directory of data library files and their parsed pickles.
+
+       Parameters
+       ----------
+       directory: str, default FF_DIR
+       download: fetch datasets missing from the directory with
+           pandas_datareader (default: True)
+
+    """
+
+    def __init__(self, directory=None, download=True):
+        self.directory = directory or FF_DIR
+        self.download = download
+
+    def source(self, name):
+        """Path of the downloaded file for `name`, or None."""
+        for suffix in _SUFFIXES:
+            path = os.path.join(self.directory, name + suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _cached(self, name):
+        return os.path.join(self.directory, name + '.pickle')
+
+    def load(self, dataset='ff3', freq='M'):
+        """Factors of `dataset` ('ff3', 'ff5' or 'mom') at freq 'M' or 'D'.
+
+        Monthly factors are indexed by the first day of the month.
+        """
+        assert (dataset, freq) in DATASETS, \
+            "Invalid dataset: {0} ({1})".format(dataset, freq)
+        name = DATASETS[(dataset, freq)]
+        source, cached = self.source(name), self._cached(name)
+
+        if os.path.exists(cached) and (source is None or
+                os.path.getmtime(cached) >= os.path.getmtime(source)):
+            try:
+                return pd.read_pickle(cached)
+            except Exception as e:
+                logging.warning('Ignoring unreadable factor cache {0}: {1}'
+                                .format(cached, e))
+
+        if source is not None:
+            df = parse(_read_source(source), freq)
+            logging.debug('Parsed {0} ({1} rows).'.format(source, len(df)))
+        elif self.download:
+            df = _download(name, freq)
+        else:
+            raise ValueError('{0} not found in {1}.'.format(name,
+                                                           self.directory))
+        self._save(cached, df)
+        return df
+
+    def _save(self, path, df):
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+            df.to_pickle(tmp)
+            os.rename(tmp, path)
+        except (IOError, OSError) as e:
+            logging.warning('Cannot write factor cache {0}: {1}'
+                            .format(path, e))
+
+def clear():
+    """Forgets the factors loaded in this process."""
+    with _lock:
+        _memo.clear()
+
+def factors_df(end=True, dataset='ff3', freq='M', store=None):
+    """Fama-French factors in percent, indexed by date.
 
-    ff.index = [dt.datetime(d/100, d%100, 1) for d in ff.index]
-    if end:
-        ff.index = ff.index.to_period('M').to_timestamp('M')
+        Parameters
+        ----------
+        end: bool, default True
+            index monthly factors by the last day of the month instead of
+            the first
+        dataset: 'ff3' (Mkt_rf, SMB, HML, rf), 'ff5' (adds RMW, CMA) or
+            'mom' (Mom)
+        freq: 'M' (monthly) or 'D' (daily)
+        store: FactorStore, default FactorStore(FF_DIR)
 
-    return ff
+        Each dataset is loaded once per process; calls return a copy.
+    """
+    store = store or FactorStore()
+    end = bool(end) and freq == 'M'
+    key = (os.path.abspath(store.directory), dataset, freq, end)
+    with _lock:
+        if key not in _memo:
+            df = store.load(dataset, freq)
+            if end:
+                df = df.copy()
+                df.index = pd.DatetimeIndex(df.index + pd.offsets.MonthEnd(0),
+                                            name='date')
+            _memo[key] = df
+        df = _memo[key]
+    return df.copy()
@@ -0,0 +1,185 @@
+"""In-memory CCM linking of frames already on the client.
+
+FUNDAQuery/FUNDQQuery(permno=True) link on the server with a theta join on
+ccmxpf_linktable (linkdt <= datadate <= linkenddt), which PostgreSQL runs as
+a nested loop. CCMLinker reads the link intervals once and links any
+(gvkey, date) or (permno, date) frame locally:
+
+    linker = wrds.link.linker()              # cached per engine
+    funda = wrds.FUNDAQuery(permno=False).read_frame()
+    funda = linker.link(funda, by='gvkey', date='datadate')
+    msf = linker.link(msf, by='permno', date='date')     # adds gvkey
+
+Lookups are vectorized: the intervals are sorted by (key, start) and each
+(key, date) is found with one np.searchsorted. When a key has overlapping
+intervals on a date (rare for primary links), the one ending last is used.
+The same index works for any interval table, e.g. CCMNamesQuery output with
+start='sdate', end='edate'.
+"""
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import db
+from .query import CCMLinkQuery
+
+# days since 1970 are offset into [0, 2**20) below each key's code
+_DAY_BITS = 20
+_DAY_OFFSET = 2**19
+
+# link table column for each key a frame can be linked by
+KEYS = {'gvkey': 'gvkey', 'permno': 'lpermno', 'permco': 'lpermco'}
+# columns added by link(), by key
+COLUMNS = {'gvkey': ['lpermno', 'lpermco'], 'permno': ['gvkey'],
+           'permco': ['gvkey']}
+
+_linkers = {}
+_lock = threading.Lock()
+
+def _days(dates):
+    """Days since 1970-01-01 as int64, with a mask of the missing dates."""
+    dates = pd.DatetimeIndex(pd.to_datetime(np.asarray(dates)))
+    missing = np.asarray(dates.isna())
+    days = dates.values.astype('datetime64[D]').astype(np.int64)
+    days[missing] = 0
+    return days, missing
+
+def _codes(index, keys):
+    """Positions of `keys` in `index` (-1 if absent)."""
+    if isinstance(keys, pd.Categorical):
+        # look up each category once
+        codes = index.get_indexer(keys.categories).astype(np.int64)
+        return np.where(keys.codes >= 0, codes[keys.codes], -1)
+    return index.get_indexer(np.asarray(keys)).astype(np.int64)
+
+class IntervalIndex(object):
+    """Sorted [start, end] date intervals per key for as-of lookups.
+
+       Parameters
+       ----------
+       keys: array of keys (gvkey, permno, ...)
+       start, end: interval dates; a missing start is open to the past and
+           a missing end open to the future
+
+    """
+
+    def __init__(self, keys, start, end):
+        keys = np.asarray(keys)
+        self.keys = pd.Index(pd.unique(keys[~pd.isnull(keys)]))
+        codes = _codes(self.keys, keys)
+        lo, lo_missing = _days(start)
+        hi, hi_missing = _days(end)
+        lo[lo_missing] = -_DAY_OFFSET
+        hi[hi_missing] = _DAY_OFFSET - 1
+
+        # (code, day) packed into one sortable int64
+        starts = (codes << _DAY_BITS) + lo + _DAY_OFFSET
+        ends = (codes << _DAY_BITS) + hi + _DAY_OFFSET
+        valid = codes >= 0
+        order = np.argsort(np.where(valid, starts, -1), kind='mergesort')
+        order = order[valid[order]]
+        self.rows = order
+        self.starts = starts[order]
+        self.ends = ends[order]
+        # for each position the interval reaching furthest so far; earlier
+        # keys never reach a later key's dates since the code is in the
+        # high bits
+        if len(order):
+            reach = np.maximum.accumulate(self.ends)
+            new = np.r_[True, self.ends[1:] > reach[:-1]]
+            self.best = np.maximum.accumulate(
+                np.where(new, np.arange(len(order)), 0))
+        else:
+            self.best = np.zeros(0, dtype=np.int64)
+
+    def lookup(self, keys, dates):
+        """Row of the interval containing each (key, date), or -1."""
+        codes = _codes(self.keys, keys)
+        days, missing = _days(dates)
+        if not len(self.starts):
+            return np.full(len(codes), -1, dtype=np.int64)
+        q = (codes << _DAY_BITS) + days + _DAY_OFFSET
+        pos = np.searchsorted(self.starts, q, side='right') - 1
+        best = self.best[np.maximum(pos, 0)]
+        found = (codes >= 0) & ~missing & (pos >= 0) & (self.ends[best] >= q)
+        return np.where(found, self.rows[best], -1)
+
+class CCMLinker(object):
+    """CCM link intervals with vectorized (key, date) lookups.
+
+       Parameters
+       ----------
+       links: DataFrame of link intervals, e.g. CCMLinkQuery().read_frame()
+       start, end: interval date columns (default: linkdt, linkenddt)
+
+    """
+
+    def __init__(self, links, start='linkdt', end='linkenddt'):
+        self.links = links.reset_index(drop=True)
+        self.start = start
+        self.end = end
+        self._indexes = {}
+
+    def index(self, column):
+        """IntervalIndex on a link table column, built on first use."""
+        if column not in self._indexes:
+            self._indexes[column] = IntervalIndex(self.links[column].values,
+                                                  self.links[self.start],
+                                                  self.links[self.end])
+        return self._indexes[column]
+
+    def lookup(self, keys, dates, by='gvkey'):
+        """Link table row for each (key, date), -1 where unlinked."""
+        return self.index(KEYS.get(by, by)).lookup(keys, dates)
+
+    def link(self, df, by='gvkey', date='date', columns=None, key=None,
+             how='left'):
+        """Adds the linked columns to `df`.
+
+           Parameters
+           ----------
+           by: 'gvkey', 'permno' or 'permco' (or any link table column)
+           date: column or index level with the dates to link on
+           columns: link table columns to add (default: lpermno, lpermco
+               by gvkey; gvkey by permno/permco)
+           key: column or index level holding `by` if named differently
+           how: 'left' keeps unlinked rows (NaN links), 'inner' drops them
+               like the server-side join
+
+        """
+        assert how in ('left', 'inner'), "Invalid how: {0}".format(how)
+        columns = columns or COLUMNS.get(by, [])
+        pos = self.lookup(_values(df, key or by), _values(df, date), by)
+        if how == 'inner':
+            df = df[pos >= 0]
+            pos = pos[pos >= 0]
+        else:
+            df = df.copy()
+        for col in columns:
+            values = self.links[col].reindex(pos)
+            if how == 'inner' or (pos >= 0).all():
+                values = values.astype(self.links[col].dtype)
+            df[col] = values.values
+        return df
+
+def _values(df, name):
+    if name in df.columns:
+        return df[name].values
+    return df.index.get_level_values(name).values
+
+def linker(engine=None, refresh=False, **kwargs):
+    """CCMLinker on `engine`'s link table, cached for the process.
+
+       kwargs are passed to CCMLinkQuery.read_frame, e.g. cache=ResultCache
+       to keep the link table on disk between sessions.
+    """
+    engine = engine or db.get_engine()
+    key = str(engine.url)
+    with _lock:
+        if refresh or key not in _linkers:
+            links = CCMLinkQuery(engine=engine).read_frame(**kwargs)
+            _linkers[key] = CCMLinker(links)
+            logging.info('CCM linker: {0} links.'.format(len(links)))
+        return _linkers[key]
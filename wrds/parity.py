@@ -0,0 +1,80 @@
+"""Compares the frames the query classes return on two databases.
+
+Typically the reference is the PostgreSQL WRDS server and the candidate an
+in-process engine loaded with Parquet extracts of the same tables (see
+benchmarks/parity.py). Frames are compared after sorting rows and columns,
+with a relative tolerance for floats.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .query import CRSPQuery, FUNDAQuery, FUNDQQuery, CCMNamesQuery, \
+    CCMLinkQuery
+
+ANOMALIES = dict(nsi=True, tac=True, noa=True, gp=True, ag=True, ia=True,
+                 roa=True, oscore=True)
+
+# name -> (query class, arguments)
+QUERIES = [
+    ('crsp_msf', CRSPQuery, dict(vwm=6, start_date='1990-01-01')),
+    ('crsp_msf_dec', CRSPQuery, dict(vwm=12, start_date='1990-01-01')),
+    ('crsp_dsf', CRSPQuery, dict(freq='dsf', vwm=None,
+                                 start_date='2005-01-01')),
+    ('funda', FUNDAQuery, dict(me_comp=True, **ANOMALIES)),
+    ('funda_sql', FUNDAQuery, dict(compute='sql', **ANOMALIES)),
+    ('fundq', FUNDQQuery, dict(chsdp=True)),
+    ('ccm_names', CCMNamesQuery, {}),
+    ('ccm_link', CCMLinkQuery, {}),
+]
+
+def normalize(df):
+    keys = [k for k in df.index.names if k is not None]
+    df = df.reset_index(drop=not keys)
+    df = df[sorted(df.columns)]
+    for col in df.columns:
+        if str(df[col].dtype) == 'category':
+            df[col] = df[col].astype(object)
+        elif str(df[col].dtype).startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col]).dt.normalize()
+    # the index, then exact-valued columns to break ties
+    keys += [c for c in df.columns if c not in keys and df[c].dtype.kind
+             not in 'fc']
+    return df.sort_values(keys).reset_index(drop=True)
+
+def compare(ref, new, rtol=1e-6):
+    """None if equal, else a description of the first difference."""
+    ref, new = normalize(ref), normalize(new)
+    if list(ref.columns) != list(new.columns):
+        return 'columns differ: {0}'.format(
+            sorted(set(ref.columns) ^ set(new.columns)))
+    if len(ref) != len(new):
+        return 'rows differ: {0} vs {1}'.format(len(ref), len(new))
+    for col in ref.columns:
+        a, b = ref[col], new[col]
+        if a.dtype.kind in 'fiu' and b.dtype.kind in 'fiu':
+            same = np.isclose(a.astype(float), b.astype(float), rtol=rtol,
+                              equal_nan=True)
+        else:
+            same = (a.astype(str) == b.astype(str)).values
+        if not same.all():
+            i = np.flatnonzero(~same)[0]
+            return '{0}: {1} rows differ, e.g. {2!r} vs {3!r}'.format(
+                col, (~same).sum(), a.iloc[i], b.iloc[i])
+    return None
+
+def run(reference, candidate, queries=QUERIES):
+    failures = 0
+    for name, cls, kwargs in queries:
+        try:
+            frames = [cls(engine=engine, **kwargs).read_frame()
+                      for engine in (reference, candidate)]
+            problem = compare(*frames)
+        except Exception as e:
+            logging.exception('{0} failed.'.format(name))
+            problem = 'error: {0}'.format(e)
+        print('{0:<14}{1}'.format(name, problem or
+                                  'ok ({0} rows)'.format(len(frames[0]))))
+        failures += problem is not None
+    return failures
@@ -0,0 +1,260 @@
+"""Vectorized portfolio sorts on a (permno, date) panel.
+
+Breakpoints for every formation date come from one sort of the whole panel
+(linear interpolation, as pandas' quantile), firms are assigned with one
+comparison per breakpoint, and portfolio returns are weighted sums via
+np.bincount; nothing loops over dates. An annual size sort on CRSPQuery
+output, formed in June with NYSE breakpoints and held for 12 months:
+
+    msf = wrds.CRSPQuery(vwm=6).read_frame().sort_index()
+    june = msf.index.get_level_values('date').month == 6
+    size = portfolio.ntile(msf['me'].where(june), 10, nyse=msf['exchcd'] == 1)
+    size = portfolio.hold(size, months=12)
+    ew = portfolio.returns(msf['ret_adj'], size)
+    vw = portfolio.returns(msf['ret_adj'], size, portfolio.value_weights(msf))
+
+Weights must be known before the return they weight. value_weights takes
+them from CRSPQuery's vweight, the annual buy-and-hold value of each firm
+(its vwm-month me compounded with its returns), as of the prior month; any
+other column, such as me, can be lagged the same way.
+"""
+from __future__ import division
+import numpy as np
+import pandas as pd
+
+from . import util
+
+def _floats(x):
+    """float64 array of x; missing values (also pandas' NA) become NaN."""
+    if hasattr(x, 'to_numpy'):
+        return x.to_numpy(dtype='float64', na_value=np.nan)
+    return np.asarray(x, dtype=float)
+
+def _mask(x):
+    """Boolean array of x; missing values count as False."""
+    if hasattr(x, 'to_numpy'):
+        return x.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(x, dtype=bool)
+
+def _probs(q):
+    """Interior percentiles: q equal groups, or explicit breakpoints."""
+    if np.isscalar(q):
+        return np.arange(1, q)/float(q)
+    return np.asarray(q, dtype=float)
+
+def _level(index, name):
+    """Codes and values of an index level (without re-hashing it)."""
+    if isinstance(index, pd.MultiIndex):
+        i = index.names.index(name)
+        return np.asarray(index.codes[i], dtype=np.int64), index.levels[i]
+    codes, values = pd.factorize(index.get_level_values(name))
+    return codes.astype(np.int64), values
+
+def _groups(x, date, by=None):
+    """Codes of the sorting groups (date, or date x by) of each row."""
+    codes, dates = _level(x.index, date)
+    ngroups = len(dates)
+    if by is not None:
+        by = _floats(by)
+        valid = ~np.isnan(by)
+        by_codes, by_values = pd.factorize(by[valid])
+        codes = np.where(valid, codes, -1)
+        codes[valid] = codes[valid]*len(by_values) + by_codes
+        ngroups *= max(len(by_values), 1)
+    return codes, ngroups
+
+def _quantiles(values, codes, ngroups, probs, mask=None):
+    """Percentiles `probs` of `values` within each group (ngroups x P)."""
+    ok = ~np.isnan(values) & (codes >= 0)
+    if mask is not None:
+        ok &= _mask(mask)
+    v, g = values[ok], codes[ok]
+    order = np.lexsort((v, g))
+    v = v[order]
+    if not len(v):
+        return np.full((ngroups, len(probs)), np.nan)
+    counts = np.bincount(g, minlength=ngroups)
+    starts = np.cumsum(counts) - counts
+
+    h = np.maximum(counts[:, None] - 1, 0)*probs[None, :]
+    lo = np.floor(h).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(counts[:, None] - 1, 0))
+    empty = counts == 0
+    ilo = np.where(empty[:, None], 0, starts[:, None] + lo)
+    ihi = np.where(empty[:, None], 0, starts[:, None] + hi)
+    bps = v[ilo] + (h - lo)*(v[ihi] - v[ilo])
+    bps[empty] = np.nan
+    return bps
+
+def _assign(values, codes, bps):
+    """Bucket 1..P+1 of each value given its group's breakpoints."""
+    rows = np.maximum(codes, 0)
+    bps = np.ascontiguousarray(bps.T)
+    bucket = np.ones(len(values))
+    for j in range(len(bps)):
+        # values equal to a breakpoint go to the lower bucket
+        bucket += values > bps[j].take(rows)
+    bucket[np.isnan(values) | (codes < 0) | np.isnan(bps[0].take(rows))] = \
+        np.nan
+    return bucket
+
+def breakpoints(x, q=10, nyse=None, date='date'):
+    """Breakpoints of x for each date.
+
+        Parameters
+        ----------
+        x: pandas.Series
+            characteristic on a panel index with a `date` level
+        q: int or list of float, default 10
+            number of equal groups, or interior percentiles such as
+            [0.3, 0.7]
+        nyse: boolean array-like, default None
+            rows the breakpoints are computed from, e.g. exchcd == 1
+
+        Returns
+        -------
+        pandas.DataFrame with one row per date and one column per percentile
+
+    """
+    probs = _probs(q)
+    codes, ngroups = _groups(x, date)
+    bps = _quantiles(_floats(x), codes, ngroups, probs, nyse)
+    dates = _level(x.index, date)[1]
+    return pd.DataFrame(bps, index=pd.Index(dates, name=date),
+                        columns=probs).dropna(how='all').sort_index()
+
+def ntile(x, q=10, nyse=None, by=None, date='date'):
+    """Bucket (1 = lowest) of each row of x among its date's rows.
+
+        Parameters
+        ----------
+        x: pandas.Series
+            characteristic on a panel index with a `date` level; rows that
+            are NaN (e.g. outside the formation month) get no bucket
+        q: int or list of float, default 10
+            number of equal groups, or interior percentiles
+        nyse: boolean array-like, default None
+            rows the breakpoints are computed from, e.g. exchcd == 1
+        by: array-like, default None
+            sort within these groups as well as dates (dependent sorts)
+
+    """
+    probs = _probs(q)
+    values = _floats(x)
+    codes, ngroups = _groups(x, date, by)
+    bps = _quantiles(values, codes, ngroups, probs, nyse)
+    return pd.Series(_assign(values, codes, bps), index=x.index, name=x.name)
+
+def double_sort(x, y, q=(5, 5), nyse=None, dependent=False, date='date'):
+    """Two-way sort on x and y.
+
+        Parameters
+        ----------
+        q: pair of int or list of float
+            groups (or percentiles) for x and y
+        dependent: bool, default False
+            sort on y within x buckets instead of independently
+
+        Returns
+        -------
+        pandas.DataFrame of the x and y buckets
+
+    """
+    bx = ntile(x, q[0], nyse, date=date)
+    by = ntile(y, q[1], nyse, by=bx.values if dependent else None, date=date)
+    return pd.DataFrame({x.name or 'x': bx, y.name or 'y': by},
+                        columns=[x.name or 'x', y.name or 'y'])
+
+def hold(bucket, months=12, group='permno', date='date'):
+    """Carries buckets assigned at formation to the following months.
+
+        Each row gets the bucket of its firm's latest non-missing bucket
+        1 to `months` months earlier, so a June sort covers July to June.
+        Monthly dates are matched by calendar month.
+    """
+    index = bucket.index
+    codes = pd.factorize(index.get_level_values(group))[0].astype(np.int64)
+    dates = pd.DatetimeIndex(index.get_level_values(date))
+    month = np.asarray(dates.year*12 + dates.month - 1, dtype=np.int64)
+    valid = (codes >= 0) & ~np.asarray(dates.isnull())
+    key = (codes << 20) + np.where(valid, month, 0)
+
+    values = _floats(bucket)
+    src = np.flatnonzero(valid & ~np.isnan(values))
+    if not len(src):
+        return pd.Series(np.nan, index=index, name=bucket.name)
+    src = src[np.argsort(key[src], kind='mergesort')]
+    # latest formation strictly before each row
+    pos = np.searchsorted(key[src], key - 1, side='right') - 1
+    found = valid & (pos >= 0)
+    pos = src[np.maximum(pos, 0)]
+    found &= (codes[pos] == codes) & (month - month[pos] <= months)
+    return pd.Series(np.where(found, values[pos], np.nan), index=index,
+                     name=bucket.name)
+
+def value_weights(msf, column='vweight', group='permno', date='date'):
+    """Value weights of each month's return: `column` of the prior month.
+
+        CRSPQuery's vweight at month t compounds the formation-month me with
+        the returns through t, so the weight of t's return is the firm's
+        vweight at t-1 (NaN when that month is missing).
+    """
+    return util.LAG(msf[column], group=group, date=date, period=1)
+
+def returns(ret, bucket, weights=None, date='date', counts=False):
+    """Equal- or value-weighted portfolio returns for each date.
+
+        Parameters
+        ----------
+        ret: pandas.Series
+            returns on the panel index
+        bucket: pandas.Series or DataFrame
+            portfolio of each row (a DataFrame for double sorts)
+        weights: pandas.Series, default None
+            value weights known before the return (e.g. value_weights(msf));
+            equal weights if None
+        counts: bool, default False
+            also return the number of firms in each portfolio
+
+        Returns
+        -------
+        pandas.DataFrame with one row per date and one column per portfolio
+        (and the counts, if requested)
+
+    """
+    r = _floats(ret)
+    w = np.ones(len(r)) if weights is None else \
+        _floats(weights)
+    if isinstance(bucket, pd.DataFrame):
+        labels = pd.MultiIndex.from_arrays([bucket[c].values
+                                            for c in bucket.columns],
+                                           names=list(bucket.columns))
+        missing = bucket.isnull().any(axis=1).values
+    else:
+        labels = pd.Index(bucket.values, name=bucket.name)
+        missing = bucket.isnull().values
+    dcode, dates = _level(ret.index, date)
+    ok = ~np.isnan(r) & ~np.isnan(w) & (w > 0) & ~missing & (dcode >= 0)
+
+    dcode = dcode[ok]
+    bcode, ports = labels[ok].factorize()
+    key = dcode*len(ports) + bcode
+    shape = (len(dates), len(ports))
+    num = np.bincount(key, weights=w[ok]*r[ok], minlength=shape[0]*shape[1])
+    den = np.bincount(key, weights=w[ok], minlength=shape[0]*shape[1])
+    n = np.bincount(key, minlength=shape[0]*shape[1]).reshape(shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = (num/den).reshape(shape)
+
+    if isinstance(ports, pd.MultiIndex):
+        ports.names = labels.names
+    else:
+        ports = pd.Index(ports, name=labels.name)
+    used = n.sum(axis=1) > 0
+    index = pd.Index(dates, name=date)[used]
+    result = pd.DataFrame(values[used], index=index, columns=ports)
+    result = result.sort_index().sort_index(axis=1)
+    if counts:
+        n = pd.DataFrame(n[used], index=index, columns=ports)
+        return result, n.sort_index().sort_index(axis=1)
+    return result
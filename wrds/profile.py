@@ -0,0 +1,345 @@
+"""Per-stage instrumentation of WRDSQuery.read_frame.
+
+Every read_frame call records a QueryStats on the query (``q.stats``) with
+one StageStats per stage:
+
+    compile     compiling the SQLAlchemy statement
+    execute     running the statement on the server
+    first_row   latency to the first chunk: execute plus the first fetch
+    fetch       fetching all chunks (including the first)
+    to_df       building DataFrames from the fetched rows
+    concat      concatenating the chunks
+    cache       reading the result from a ResultCache
+
+Each stage keeps its wall time, rows, bytes (of the frames, object columns
+counted shallow), rows per second, the process's peak RSS at its end
+(getrusage, so spikes inside the stage count) and how much the stage raised
+that peak (largest over calls). Finished stats are passed to the registered hooks (``add_hook``):
+log_hook (the default), PrometheusHook (text exposition format, e.g. for a
+node_exporter textfile collector) and JSONHook (one JSON line per read).
+``with pipeline() as p:`` aggregates all reads of a research pipeline.
+"""
+import os
+import sys
+import json
+import logging
+import threading
+from timeit import default_timer
+from collections import OrderedDict
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+STAGES = ('compile', 'execute', 'first_row', 'fetch', 'to_df', 'concat',
+          'cache')
+
+_hooks = []
+_pipelines = []
+_lock = threading.RLock()
+
+def rss():
+    """Resident set size of this process in bytes (0 if unknown)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, AttributeError):
+        return 0
+
+def peak_rss():
+    """Peak resident set size of this process so far in bytes."""
+    if resource is None:
+        return rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak*1024
+
+class StageStats(object):
+    """Totals for one stage of one or more reads."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.
+        self.rows = 0
+        self.bytes = 0
+        self.peak_rss = 0
+        self.peak_rss_delta = 0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows/self.seconds if self.seconds > 0 else 0.
+
+    def add(self, seconds, rows=0, nbytes=0, peak_rss=0, peak_rss_delta=0):
+        self.calls += 1
+        self.seconds += seconds
+        self.rows += rows
+        self.bytes += nbytes
+        self.peak_rss = max(self.peak_rss, peak_rss)
+        self.peak_rss_delta = max(self.peak_rss_delta, peak_rss_delta)
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.rows += other.rows
+        self.bytes += other.bytes
+        self.peak_rss = max(self.peak_rss, other.peak_rss)
+        self.peak_rss_delta = max(self.peak_rss_delta, other.peak_rss_delta)
+
+    def as_dict(self):
+        return {'calls': self.calls, 'seconds': self.seconds,
+                'rows': self.rows, 'bytes': self.bytes,
+                'rows_per_sec': self.rows_per_sec,
+                'peak_rss': self.peak_rss,
+                'peak_rss_delta': self.peak_rss_delta}
+
+    def __repr__(self):
+        return ('StageStats({0}: {1:.4f}s, {2} rows, {3} bytes, '
+                '{4:.0f} rows/s)'.format(self.name, self.seconds, self.rows,
+                                         self.bytes, self.rows_per_sec))
+
+class QueryStats(object):
+    """Stage timings of one read_frame call (thread-safe)."""
+
+    def __init__(self, query=''):
+        self.query = query
+        self.started = default_timer()
+        self.seconds = None
+        self.rows = 0
+        self.stages = OrderedDict((s, StageStats(s)) for s in STAGES)
+        # the WRDSQuery read, and its plan if captured by auto_explain
+        self.source = None
+        self.plan = None
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, rows=0, nbytes=0, peak_rss_delta=0):
+        peak = peak_rss()
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = StageStats(stage)
+            self.stages[stage].add(seconds, rows, nbytes, peak,
+                                   peak_rss_delta)
+
+    def timer(self, stage):
+        """Context manager recording the wall time of a block as `stage`."""
+        return _Timer(self, stage)
+
+    def finish(self, rows):
+        """Closes the stats and passes them to the hooks and pipelines."""
+        if self.seconds is not None:
+            return
+        self.seconds = default_timer() - self.started
+        self.rows = rows
+        with _lock:
+            hooks, pipelines = list(_hooks), list(_pipelines)
+        for hook in hooks:
+            try:
+                hook(self)
+            except Exception:
+                logging.exception('read_frame stats hook failed')
+        for p in pipelines:
+            p.add(self)
+
+    def as_dict(self):
+        return {'query': self.query, 'seconds': self.seconds,
+                'rows': self.rows,
+                'stages': OrderedDict((s.name, s.as_dict())
+                                      for s in self.stages.values()
+                                      if s.calls)}
+
+    def __repr__(self):
+        return 'QueryStats({0}: {1} rows in {2}s; {3})'.format(
+            self.query, self.rows,
+            '?' if self.seconds is None else '{0:.3f}'.format(self.seconds),
+            ', '.join('{0} {1:.3f}s'.format(s.name, s.seconds)
+                      for s in self.stages.values() if s.calls))
+
+class _Timer(object):
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+        self.rows = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self.peak = peak_rss()
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = default_timer() - self.start
+        self.stats.record(self.stage, self.seconds, self.rows, self.bytes,
+                          peak_rss() - self.peak)
+
+def frame_bytes(df):
+    """Shallow in-memory size of a DataFrame (0 for other results)."""
+    try:
+        return int(df.memory_usage(index=True).sum())
+    except AttributeError:
+        return 0
+
+# hooks
+
+def add_hook(hook):
+    """Calls hook(stats) after every read_frame."""
+    with _lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+    return hook
+
+def remove_hook(hook):
+    with _lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+def log_hook(stats):
+    """Logs one INFO line per read with the time spent in each stage."""
+    logging.info('read_frame {0}: {1} rows in {2:.2f}s ({3:.0f} rows/s); '
+                 '{4}'.format(stats.query, stats.rows, stats.seconds,
+                              stats.rows/max(stats.seconds, 1e-9),
+                              ', '.join('{0} {1:.3f}s'.format(s.name, s.seconds)
+                                        for s in stats.stages.values()
+                                        if s.calls)))
+
+class JSONHook(object):
+    """Appends each read's stats to `path` as one JSON line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, stats):
+        line = json.dumps(stats.as_dict())
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+class PrometheusHook(object):
+    """Cumulative read_frame metrics in the Prometheus text format.
+
+        render() returns the exposition text; with `path` it is also written
+        there (atomically) after every read.
+    """
+
+    def __init__(self, path=None, prefix='wrds_read_frame'):
+        self.path = path
+        self.prefix = prefix
+        self.reads = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, stats):
+        with self._lock:
+            self.reads[stats.query] = self.reads.get(stats.query, 0) + 1
+            for s in stats.stages.values():
+                if not s.calls:
+                    continue
+                key = (stats.query, s.name)
+                if key not in self.stages:
+                    self.stages[key] = StageStats(s.name)
+                self.stages[key].merge(s)
+            if self.path:
+                tmp = '{0}.{1}.tmp'.format(self.path, os.getpid())
+                with open(tmp, 'w') as f:
+                    f.write(self._render())
+                os.rename(tmp, self.path)
+
+    def render(self):
+        with self._lock:
+            return self._render()
+
+    def _render(self):
+        p = self.prefix
+        lines = ['# TYPE {0}_calls_total counter'.format(p)]
+        lines += ['{0}_calls_total{{query="{1}"}} {2}'.format(p, q, n)
+                  for q, n in sorted(self.reads.items())]
+        for metric, attr, kind in (('seconds_total', 'seconds', 'counter'),
+                                   ('rows_total', 'rows', 'counter'),
+                                   ('bytes_total', 'bytes', 'counter'),
+                                   ('peak_rss_bytes', 'peak_rss', 'gauge'),
+                                   ('peak_rss_delta_bytes', 'peak_rss_delta',
+                                    'gauge')):
+            lines.append('# TYPE {0}_{1} {2}'.format(p, metric, kind))
+            lines += ['{0}_{1}{{query="{2}",stage="{3}"}} {4}'.format(
+                          p, metric, q, stage, getattr(s, attr))
+                      for (q, stage), s in sorted(self.stages.items())]
+        return '\n'.join(lines) + '\n'
+
+add_hook(log_hook)
+
+# pipelines
+
+class pipeline(object):
+    """Aggregates the stats of every read_frame in a block.
+
+        with wrds.profile.pipeline('size sorts') as p:
+            crsp = wrds.CRSPQuery().read_frame()
+            funda = wrds.FUNDAQuery().read_frame()
+        print(p.report())
+
+    Pipelines see reads from all threads and may be nested.
+    """
+
+    def __init__(self, name='pipeline'):
+        self.name = name
+        self.reads = []
+        self.stages = OrderedDict()
+        self.seconds = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.started = default_timer()
+        with _lock:
+            _pipelines.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        with _lock:
+            _pipelines.remove(self)
+        self.seconds = default_timer() - self.started
+
+    def add(self, stats):
+        with self._lock:
+            self.reads.append(stats)
+            for s in stats.stages.values():
+                if s.calls:
+                    total = self.stages.setdefault(s.name, StageStats(s.name))
+                    total.merge(s)
+
+    @property
+    def rows(self):
+        return sum(s.rows for s in self.reads)
+
+    def as_dict(self):
+        return {'pipeline': self.name, 'seconds': self.seconds,
+                'reads': len(self.reads), 'rows': self.rows,
+                'stages': OrderedDict((n, s.as_dict())
+                                      for n, s in self.stages.items()),
+                'queries': [s.as_dict() for s in self.reads]}
+
+    def report(self):
+        """Table of time, rows, bytes and rows/s per stage."""
+        lines = ['{0}: {1} reads, {2} rows{3}'.format(
+            self.name, len(self.reads), self.rows,
+            '' if self.seconds is None else
+            ' in {0:.2f}s'.format(self.seconds))]
+        lines.append('{0:<10}{1:>10}{2:>14}{3:>14}{4:>14}{5:>12}{6:>12}'
+                     .format('stage', 'seconds', 'rows', 'MB', 'rows/s',
+                             'peak MB', 'peak +MB'))
+        for s in self.stages.values():
+            lines.append('{0:<10}{1:>10.3f}{2:>14,}{3:>14.1f}{4:>14,.0f}'
+                         '{5:>12.1f}{6:>12.1f}'.format(
+                             s.name, s.seconds, s.rows, s.bytes/2.**20,
+                             s.rows_per_sec, s.peak_rss/2.**20,
+                             s.peak_rss_delta/2.**20))
+        return '\n'.join(lines)
@@ -0,0 +1,122 @@
+"""Selective, shared schema reflection for WRDSQuery.
+
+Reflection is limited to the tables a query class touches. The reflected
+tables are kept in one MetaData per database URL for the whole process,
+and can be persisted to disk (``WRDS_SCHEMA_CACHE`` or SCHEMA_CACHE_DIR),
+keyed on a fingerprint of the tables' column definitions so the cache is
+invalidated when the schema changes.
+"""
+import os
+import hashlib
+import logging
+import pickle
+import threading
+
+import sqlalchemy as sa
+
+SCHEMA_CACHE_DIR = os.environ.get('WRDS_SCHEMA_CACHE')
+
+_metadata = {}
+_lock = threading.RLock()
+
+def fingerprint(engine, tables):
+    """Hash of the column names and types of `tables`."""
+    tables = sorted(tables)
+    if engine.dialect.name == 'sqlite':
+        inspector = sa.inspect(engine)
+        existing = set(inspector.get_table_names())
+        cols = [(t, c['name'], str(c['type']))
+                for t in tables if t in existing
+                for c in inspector.get_columns(t)]
+    else:
+        columns = sa.sql.table('columns',
+                               sa.sql.column('table_name'),
+                               sa.sql.column('column_name'),
+                               sa.sql.column('data_type'),
+                               sa.sql.column('ordinal_position'),
+                               schema='information_schema')
+        query = sa.select([columns.c.table_name, columns.c.column_name,
+                           columns.c.data_type]).\
+                    where(columns.c.table_name.in_(tables)).\
+                    order_by(columns.c.table_name,
+                             columns.c.ordinal_position)
+        cols = [tuple(row) for row in engine.execute(query)]
+
+    return hashlib.sha1(repr((tables, cols)).encode('utf-8')).hexdigest()
+
+def reflect(engine, tables=None, cache_dir=None):
+    """Returns the process-wide MetaData for `engine` with `tables` reflected.
+
+        Parameters
+        ----------
+        engine: sqlalchemy.engine.Engine
+        tables: list of str, default None (all tables)
+            only these tables are reflected, if not already loaded
+        cache_dir: str, default SCHEMA_CACHE_DIR
+            directory for the on-disk schema cache (None disables it)
+
+    """
+    if cache_dir is None:
+        cache_dir = SCHEMA_CACHE_DIR
+
+    with _lock:
+        key = str(engine.url)
+        metadata = _metadata.get(key)
+        if metadata is None:
+            metadata = _metadata[key] = sa.MetaData(engine)
+
+        if tables is None:
+            tables = sa.inspect(engine).get_table_names()
+        missing = [t for t in tables if t not in metadata.tables]
+        if missing:
+            if cache_dir:
+                _load_cached(metadata, engine, missing, cache_dir)
+            else:
+                _reflect(metadata, engine, missing)
+
+    return metadata
+
+def clear():
+    """Forgets all reflected MetaData in this process."""
+    with _lock:
+        _metadata.clear()
+
+def _reflect(metadata, engine, tables):
+    wanted = set(tables)
+    metadata.reflect(engine, views=True,
+                     only=lambda name, meta: name in wanted)
+    logging.debug('Reflected tables: {0}'.format(', '.join(sorted(tables))))
+
+def _load_cached(metadata, engine, tables, cache_dir):
+    name = hashlib.sha1(repr((str(engine.url), sorted(tables))).encode('utf-8'))
+    path = os.path.join(cache_dir, 'schema-{0}.pickle'.format(name.hexdigest()))
+    fp = fingerprint(engine, tables)
+
+    cached = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                cached_fp, cached = pickle.load(f)
+            if cached_fp != fp:
+                logging.debug('Schema cache {0} is stale.'.format(path))
+                cached = None
+        except Exception as e:
+            logging.warning('Ignoring unreadable schema cache {0}: {1}'
+                            .format(path, e))
+            cached = None
+
+    if cached is None:
+        cached = sa.MetaData()
+        _reflect(cached, engine, tables)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump((fp, cached), f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+    else:
+        logging.debug('Loaded tables from schema cache {0}.'.format(path))
+
+    for table in cached.sorted_tables:
+        if table.key not in metadata.tables:
+            table.tometadata(metadata)
@@ -1 +1 @@
-from sql import *
+from .sql import *
@@ -1,7 +1,22 @@
+import os
+import logging
+
 import sqlalchemy as sa
 from sqlalchemy.sql import expression
 from sqlalchemy.ext.compiler import compiles
-from sqlalchemy.types import DateTime
+from sqlalchemy.types import Date, DateTime
+
+SQL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def create_functions(engine):
+    """Creates (or replaces) the SQL functions in wrds/sql/*.psql."""
+    if engine.dialect.name != 'postgresql':
+        return
+    for name in sorted(os.listdir(SQL_DIR)):
+        if name.endswith('.psql'):
+            with open(os.path.join(SQL_DIR, name)) as f:
+                engine.execute(sa.text(f.read()))
+            logging.debug('Created SQL functions from {0}.'.format(name))
 
 class utcnow(expression.FunctionElement):
     type = DateTime()
@@ -14,8 +29,23 @@ def pg_utcnow(element, compiler, **kw):
 def ms_utcnow(element, compiler, **kw):
     return "GETUTCDATE()"
 
+@compiles(utcnow, 'sqlite')
+def sqlite_utcnow(element, compiler, **kw):
+    # sqlite's CURRENT_TIMESTAMP is in UTC
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, 'duckdb')
+def duckdb_utcnow(element, compiler, **kw):
+    return "timezone('UTC', current_timestamp)"
+
 class fiscal_year(expression.FunctionElement):
-    type = DateTime()
+    """Fiscal year end label: d's month shifted forward by 12 - m months.
+
+       Months up to m fall in the same calendar year, later months in the
+       next one; with last=True the label is the last day of that month.
+       Requires create_functions() on PostgreSQL; inlined elsewhere.
+    """
+    type = Date()
     name = 'fiscal_year'
 
 @compiles(fiscal_year, 'postgresql')
@@ -28,3 +58,83 @@ def pg_fiscal_year(element, compiler, **kw):
             compiler.process(m),
             compiler.process(last)
         )
+
+# Clauses used twice are processed once per use, in textual order, so
+# positional bind parameters (sqlite, duckdb) line up.
+
+@compiles(fiscal_year, 'sqlite')
+def sqlite_fiscal_year(element, compiler, **kw):
+    d, m, last = list(element.clauses)
+    p = lambda c: compiler.process(c, **kw)
+    return "CASE WHEN {0} THEN " \
+           "date({1}, 'start of month', '+' || (13 - {2}) || ' months', " \
+           "'-1 day') " \
+           "ELSE date({3}, 'start of month', '+' || (12 - {4}) || ' months') " \
+           "END".format(p(last), p(d), p(m), p(d), p(m))
+
+@compiles(fiscal_year, 'duckdb')
+def duckdb_fiscal_year(element, compiler, **kw):
+    d, m, last = list(element.clauses)
+    p = lambda c: compiler.process(c, **kw)
+    return "CAST(CASE WHEN {0} " \
+           "THEN date_trunc('month', CAST({1} AS DATE)) + to_months(13 - {2}) " \
+           "- INTERVAL 1 DAY " \
+           "ELSE date_trunc('month', CAST({3} AS DATE)) + to_months(12 - {4}) " \
+           "END AS DATE)".format(p(last), p(d), p(m), p(d), p(m))
+
+class month_start(expression.FunctionElement):
+    """First day of d's month, shifted by `months` months."""
+    type = Date()
+    name = 'month_start'
+
+    def __init__(self, d, months=0):
+        self.months = int(months)
+        super(month_start, self).__init__(d)
+
+@compiles(month_start, 'postgresql')
+def pg_month_start(element, compiler, **kw):
+    d, = list(element.clauses)
+    return "CAST(date_trunc('month', CAST({0} AS timestamp)) + " \
+           "INTERVAL '{1} month' AS date)".format(
+            compiler.process(d), element.months)
+
+@compiles(month_start, 'sqlite')
+def sqlite_month_start(element, compiler, **kw):
+    d, = list(element.clauses)
+    return "date({0}, 'start of month', '{1:+d} months')".format(
+            compiler.process(d), element.months)
+
+@compiles(month_start, 'duckdb')
+def duckdb_month_start(element, compiler, **kw):
+    d, = list(element.clauses)
+    return "CAST(date_trunc('month', CAST({0} AS DATE)) + " \
+           "to_months({1}) AS DATE)".format(compiler.process(d), element.months)
+
+class year_end(expression.FunctionElement):
+    """Last day of d's year, shifted by `years` years."""
+    type = Date()
+    name = 'year_end'
+
+    def __init__(self, d, years=0):
+        self.years = int(years)
+        super(year_end, self).__init__(d)
+
+@compiles(year_end, 'postgresql')
+def pg_year_end(element, compiler, **kw):
+    d, = list(element.clauses)
+    return "CAST(date_trunc('year', CAST({0} AS timestamp)) + " \
+           "INTERVAL '{1} year - 1 day' AS date)".format(
+            compiler.process(d), element.years + 1)
+
+@compiles(year_end, 'sqlite')
+def sqlite_year_end(element, compiler, **kw):
+    d, = list(element.clauses)
+    return "date({0}, 'start of year', '{1:+d} years', '-1 day')".format(
+            compiler.process(d), element.years + 1)
+
+@compiles(year_end, 'duckdb')
+def duckdb_year_end(element, compiler, **kw):
+    d, = list(element.clauses)
+    return "CAST(date_trunc('year', CAST({0} AS DATE)) + to_years({1}) " \
+           "- INTERVAL 1 DAY AS DATE)".format(
+            compiler.process(d), element.years + 1)
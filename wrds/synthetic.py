@@ -0,0 +1,295 @@
+"""Synthetic WRDS-shaped tables for benchmarks and offline development.
+
+Builds msf, dsf, senames, msenames, sedelist, funda, fundq and
+ccmxpf_linktable with the columns the query classes use, so CRSPQuery,
+FUNDAQuery, read_frame and the comp/crsp functions can be exercised without
+licensed data. Firms enter and exit during the sample, change names and
+exchanges, are delisted (with delisting returns) or merged, and are linked
+to Compustat through one or more link intervals. Returns follow a one-factor
+model (monthly returns compound the daily ones) and accounting items follow
+a random walk in total assets, with missing values sprinkled in.
+
+    python -m wrds.synthetic sqlite:///wrds_synthetic.db --firms 2000
+
+Firms are generated and written in batches, so memory use does not grow
+with the number of firms.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+TABLES = ('msf', 'dsf', 'senames', 'msenames', 'sedelist',
+          'funda', 'fundq', 'ccmxpf_linktable')
+
+# indexes on the keys, as on the WRDS server
+INDEXES = {'msf': [('permno', 'date')], 'dsf': [('permno', 'date')],
+           'senames': [('permno', 'namedt')], 'msenames': [('permno',)],
+           'sedelist': [('permno', 'dlstdt')],
+           'funda': [('gvkey', 'datadate')], 'fundq': [('gvkey', 'datadate')],
+           'ccmxpf_linktable': [('gvkey',), ('lpermno',)]}
+
+# share of values set to NULL, by column
+MISSING = {'ret': 0.005, 'txditc': 0.1, 'txdb': 0.1, 'pstkrv': 0.3,
+           'pstkl': 0.3, 'mib': 0.2, 'gp': 0.05, 'invt': 0.1, 'txp': 0.2,
+           'wcap': 0.05, 'ebitda': 0.05, 'rdq': 0.05, 'seq': 0.05}
+
+def generate(engine, firms=1000, start='2000-01-01', end='2009-12-31',
+             daily=True, seed=0, batch=200):
+    """Writes synthetic WRDS tables into `engine`, replacing existing ones.
+
+        Parameters
+        ----------
+        engine: sqlalchemy.engine.Engine
+        firms: number of CRSP/Compustat firms
+        start, end: sample period
+        daily: also build dsf (about 250 rows per firm-year)
+        seed: random seed; the same arguments give the same tables
+        batch: firms generated and written at a time
+
+        Returns
+        -------
+        dict of table -> rows written
+
+    """
+    rng = np.random.RandomState(seed)
+    days = pd.bdate_range(start, end)
+    month = days.to_period('M')
+    # CRSP dates monthly rows by the month's last trading day
+    month_ends = pd.Series(days, index=month).groupby(level=0).max()
+    market = _market(rng, days)
+
+    for name in TABLES:
+        sa.Table(name, sa.MetaData()).drop(engine, checkfirst=True)
+
+    counts = dict((name, 0) for name in TABLES)
+    for first in range(0, firms, batch):
+        ids = np.arange(first, min(first + batch, firms))
+        tables = _batch(rng, ids, days, month_ends, market, daily)
+        for name, df in tables.items():
+            if not len(df):
+                continue
+            _write(df, name, engine)
+            counts[name] += len(df)
+        logging.info('synthetic: {0} of {1} firms written.'.format(
+            ids[-1] + 1, firms))
+
+    metadata = sa.MetaData()
+    for name, specs in INDEXES.items():
+        if not counts[name]:
+            continue
+        table = sa.Table(name, metadata, autoload=True, autoload_with=engine)
+        for cols in specs:
+            sa.Index('_'.join(['ix', name] + list(cols)),
+                     *[table.c[c] for c in cols]).create(engine)
+    return counts
+
+def _market(rng, days):
+    return pd.Series(rng.normal(0.0004, 0.011, len(days)), index=days)
+
+def _write(df, name, engine):
+    df = df.copy()
+    for col in df.columns:
+        if str(df[col].dtype).startswith('datetime64'):
+            df[col] = [d.date() if not pd.isnull(d) else None
+                       for d in df[col]]
+    df.to_sql(name, engine, index=False, if_exists='append',
+              chunksize=10000)
+
+def _missing(rng, df):
+    for col, share in MISSING.items():
+        if col in df:
+            df.loc[rng.rand(len(df)) < share, col] = np.nan
+    return df
+
+def _batch(rng, ids, days, month_ends, market, daily):
+    """All tables for firms `ids`."""
+    n_months = len(month_ends)
+    frames = dict((name, []) for name in TABLES)
+
+    for i in ids:
+        permno, permco = 10000 + i, 50000 + i
+        gvkey = '{0:06d}'.format(1000 + i)
+
+        # life: a third are listed at the start, the rest enter later
+        entry = 0 if rng.rand() < 0.35 else rng.randint(0, n_months - 12)
+        life = max(int(rng.exponential(150)), 6)
+        exit = min(entry + life, n_months)
+        delisted = exit < n_months
+        months = month_ends.iloc[entry:exit]
+        fdays = days[(days >= months.index[0].start_time) &
+                     (days <= months.iloc[-1])]
+
+        # one-factor daily returns, compounded to months
+        beta = rng.normal(1., 0.4)
+        r = beta*market.reindex(fdays).values + \
+            rng.normal(0, rng.uniform(0.015, 0.04), len(fdays))
+        r = np.maximum(r, -0.6)
+        divs = np.where(rng.rand(len(fdays)) < 0.004,
+                        rng.uniform(0.002, 0.01, len(fdays)), 0.)
+        prc = rng.uniform(5, 80)*np.cumprod(1 + r - divs)
+        shrout = np.round(rng.uniform(2e3, 2e5) *
+                          np.cumprod(np.where(rng.rand(len(fdays)) < 0.003,
+                                              rng.uniform(0.9, 1.3,
+                                                          len(fdays)), 1.)))
+        dsf = pd.DataFrame({'permno': permno, 'permco': permco,
+                            'date': fdays, 'ret': r, 'retx': r - divs,
+                            'prc': prc, 'shrout': shrout})
+        # bid/ask midpoints are stored as negative prices
+        dsf.loc[rng.rand(len(dsf)) < 0.02, 'prc'] *= -1
+
+        grp = dsf.groupby(dsf['date'].dt.to_period('M'))
+        compound = lambda x: np.expm1(np.log1p(x).groupby(grp.ngroup()).sum())
+        msf = pd.DataFrame({'permno': permno, 'permco': permco,
+                            'date': grp['date'].max().values,
+                            'ret': compound(dsf['ret']).values,
+                            'retx': compound(dsf['retx']).values,
+                            'prc': grp['prc'].last().values,
+                            'shrout': grp['shrout'].last().values})
+        # the first month has no prior price
+        msf.loc[0, ['ret', 'retx']] = np.nan
+        frames['msf'].append(_missing(rng, msf))
+        if daily:
+            dsf.loc[0, ['ret', 'retx']] = np.nan
+            frames['dsf'].append(_missing(rng, dsf))
+
+        # name history: 1-3 spells with their own ticker, cusip, exchange
+        spells = sorted(rng.choice(np.arange(1, len(months)),
+                                   min(rng.randint(0, 3), len(months) - 1),
+                                   replace=False)) if len(months) > 1 else []
+        bounds = [0] + list(spells) + [len(months)]
+        for k, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+            namedt = months.index[lo].start_time
+            namedt = fdays[fdays >= namedt][0]
+            frames['senames'].append(pd.DataFrame({
+                'permno': [permno], 'permco': [permco],
+                'namedt': [namedt], 'nameendt': [months.iloc[hi - 1]],
+                'ticker': ['T{0}{1}'.format(i, k)],
+                'ncusip': ['{0:06d}{1:02d}'.format(i, k)],
+                'comnam': ['FIRM {0} {1}'.format(i, k)],
+                'shrcd': [rng.choice([10, 11, 11, 11, 12])],
+                'exchcd': [rng.choice([1, 2, 3, 3])]}))
+
+        if delisted:
+            performance = rng.rand() < 0.4
+            dlstdt = months.iloc[-1] - pd.Timedelta(days=rng.randint(0, 10))
+            frames['sedelist'].append(pd.DataFrame({
+                'permno': [permno], 'dlstdt': [dlstdt],
+                'dlstcd': [rng.choice([550, 560, 574, 580]) if performance
+                           else rng.choice([231, 233, 241])],
+                'dlret': [np.nan if rng.rand() < 0.2 else
+                          (rng.normal(-0.3, 0.15) if performance
+                           else rng.normal(0.1, 0.1))]}))
+
+        # CCM links: coverage starts at or shortly after listing and may
+        # break into a second interval; active links have no end date
+        linkdt = months.index[0].start_time + \
+            pd.DateOffset(months=rng.randint(0, 24))
+        linkend = None if not delisted else months.iloc[-1]
+        links = [(linkdt, linkend, 'LC', 'P')]
+        if rng.rand() < 0.1 and linkend is None:
+            split = linkdt + pd.DateOffset(months=rng.randint(6, 60))
+            links = [(linkdt, split, 'LU', 'C'),
+                     (split + pd.Timedelta(days=1), None, 'LC', 'P')]
+        if rng.rand() < 0.05:
+            # research-only link rejected by the query filters
+            links.append((linkdt, linkend, 'NR', 'J'))
+        frames['ccmxpf_linktable'].append(pd.DataFrame(
+            [{'gvkey': gvkey, 'lpermno': permno, 'lpermco': permco,
+              'linktype': t, 'linkprim': p, 'usedflag': 1 if t != 'NR' else -1,
+              'linkdt': lo, 'linkenddt': hi} for lo, hi, t, p in links]))
+
+        fyr = rng.choice([12, 12, 12, 6, 9, 3])
+        first, last = months.index[0], months.index[-1]
+        frames['funda'].append(_funda(rng, gvkey, fyr, first, last))
+        frames['fundq'].append(_fundq(rng, gvkey, fyr, first, last))
+
+    return _finish(frames)
+
+def _finish(frames):
+    out = {}
+    for name, f in frames.items():
+        out[name] = pd.concat(f, ignore_index=True) if f else pd.DataFrame()
+    # monthly and daily name histories are the same in CRSP
+    out['msenames'] = out['senames']
+    return out
+
+def _fiscal_ends(fyr, first, last, step):
+    ends = pd.period_range(first - 12, last, freq='M')
+    ends = ends[(ends.month - fyr) % step == 0]
+    return ends.to_timestamp(how='end').normalize()
+
+def _accounts(rng, n):
+    """Balance sheet and income items driven by a random walk in assets."""
+    at = rng.uniform(50, 5000)*np.exp(np.cumsum(rng.normal(0.06, 0.2, n)))
+    share = lambda lo, hi: at*rng.uniform(lo, hi, n)
+    lt = share(0.3, 0.8)
+    seq = at - lt
+    pstk = np.where(rng.rand(n) < 0.2, share(0, 0.03), 0.)
+    ib = share(-0.1, 0.12)
+    act, lct = share(0.2, 0.5), share(0.1, 0.4)
+    return dict(at=at, lt=lt, seq=seq, ceq=seq - pstk, pstk=pstk,
+                pstkl=pstk, pstkrv=pstk, txditc=share(0, 0.04),
+                txdb=share(0, 0.04), csho=rng.uniform(5, 500) *
+                np.cumprod(rng.uniform(0.98, 1.06, n)),
+                prcc_f=rng.uniform(5, 80, n), ajex=np.cumprod(
+                    np.where(rng.rand(n) < 0.05, 2., 1.)),
+                act=act, che=share(0.02, 0.2), lct=lct, dlc=share(0, 0.1),
+                txp=share(0, 0.02), dp=share(0.01, 0.05),
+                dltt=share(0.05, 0.4), mib=share(0, 0.02),
+                gp=share(0.1, 0.4), ppegt=share(0.1, 0.6),
+                invt=share(0, 0.2), ib=ib, ni=ib + share(-0.01, 0.01),
+                wcap=act - lct, ebitda=share(0.02, 0.2))
+
+def _funda(rng, gvkey, fyr, first, last):
+    dates = _fiscal_ends(fyr, first, last, 12)
+    if not len(dates):
+        return pd.DataFrame()
+    df = pd.DataFrame(_accounts(rng, len(dates)))
+    df.insert(0, 'gvkey', gvkey)
+    df.insert(1, 'datadate', dates)
+    df['fyr'] = fyr
+    for col, value in (('indfmt', 'INDL'), ('datafmt', 'STD'),
+                       ('popsrc', 'D'), ('consol', 'C')):
+        df[col] = value
+    # some firm-years also appear in the financial services format
+    fs = df[rng.rand(len(df)) < 0.1].copy()
+    fs['indfmt'] = 'FS'
+    return _missing(rng, pd.concat([df, fs], ignore_index=True))
+
+def _fundq(rng, gvkey, fyr, first, last):
+    dates = _fiscal_ends(fyr, first, last, 3)
+    if not len(dates):
+        return pd.DataFrame()
+    acc = _accounts(rng, len(dates))
+    df = pd.DataFrame({'gvkey': gvkey, 'datadate': dates,
+                       'rdq': dates + pd.to_timedelta(
+                           rng.randint(20, 60, len(dates)), unit='D'),
+                       'indfmt': 'INDL', 'datafmt': 'STD', 'popsrc': 'D',
+                       'consol': 'C'})
+    for col in ('ib', 'at', 'ni', 'lt', 'che', 'pstk', 'txditc', 'seq',
+                'ceq', 'txdb'):
+        df[col + 'q'] = acc[col]/(4. if col in ('ib', 'ni') else 1.)
+    return _missing(rng, df)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Builds synthetic WRDS '
+                                     'tables in a database.')
+    parser.add_argument('url', help='SQLAlchemy database URL')
+    parser.add_argument('--firms', type=int, default=1000)
+    parser.add_argument('--start', default='2000-01-01')
+    parser.add_argument('--end', default='2009-12-31')
+    parser.add_argument('--no-daily', dest='daily', action='store_false')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    counts = generate(sa.create_engine(args.url), args.firms, args.start,
+                      args.end, args.daily, args.seed)
+    for name in TABLES:
+        print('{0:<18}{1:>12,}'.format(name, counts[name]))
+
+if __name__ == '__main__':
+    main()
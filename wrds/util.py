@@ -1,19 +1,26 @@
 from __future__ import division
 import pandas as pd
+import numpy as np
 import logging
+import threading
+import weakref
 from numpy import log, exp
-from time import clock
+from timeit import default_timer
 
 TIME_FUNCTIONS = True
 
 def timeit(f):
+    """Logs the wall time of each call at DEBUG level.
+
+    read_frame keeps per-stage timings instead; see wrds.profile.
+    """
     if not TIME_FUNCTIONS:
         return f
     else:
         def timed(*args, **kw):
-            ts = clock()
+            ts = default_timer()
             result = f(*args, **kw)
-            te = clock()
+            te = default_timer()
 
             logging.debug('\t:%r.%r took: %2.4f sec'\
                 ,f.__module__, f.__name__, te-ts)
@@ -21,15 +28,321 @@ def timeit(f):
 
         return timed
 
+_BYTE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024**2,
+               'MB': 1024**2, 'G': 1024**3, 'GB': 1024**3, 'T': 1024**4,
+               'TB': 1024**4}
+
+def parse_bytes(size):
+    """Converts a size such as '256MB' or '1.5G' to bytes."""
+    if isinstance(size, (int, float)):
+        return int(size)
+    s = size.strip().upper()
+    num = s.rstrip('KMGTB ')
+    unit = s[len(num):].strip()
+    if not num or unit not in _BYTE_UNITS:
+        raise ValueError('Invalid size: {0!r}'.format(size))
+    return int(float(num)*_BYTE_UNITS[unit])
+
+def apply_dtypes(df, dtypes, float32=()):
+    """Casts DataFrame columns to compact dtypes in place.
+
+        Parameters
+        ----------
+        dtypes: dict
+            column -> dtype, e.g. {'permno': 'Int32', 'ticker': 'category'}.
+            NumPy integer dtypes are replaced by their nullable pandas
+            counterparts ('int32' -> 'Int32'), so a column has the same
+            dtype in every chunk, with or without NULLs.
+        float32: list of str
+            columns (e.g. returns) to store as float32
+
+    """
+    for col, dtype in dtypes.items():
+        if col not in df:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+            continue
+        if isinstance(dtype, str) and dtype[:1] in 'iu' and \
+                np.dtype(dtype).kind in 'iu':
+            dtype = dtype.capitalize().replace('Uint', 'UInt')
+        df[col] = df[col].astype(dtype)
+    for col in float32:
+        if col in df:
+            df[col] = df[col].astype('float32')
+    return df
+
 # pandas convenience functions
 
-def LAG(x, n=1, group='gvkey'):
-    grp = x.groupby(level=group)
-    return grp.apply(lambda x: x.shift(n))
+class PanelIndex(object):
+    """Group boundaries of a panel index, for vectorized lags.
+
+    Rows are stably sorted by `group` once; within a group the original row
+    order is kept, so shifts match ``groupby(level=group).shift(n)``. The
+    positions for each lag are cached, and LAG/DIF share one PanelIndex per
+    index (see panel_index), so repeated calls on series sharing the index
+    only cost one ``take`` each.
+
+        Parameters
+        ----------
+        index: pandas.MultiIndex
+            panel index, e.g. (gvkey, date) or (permno, date)
+        group: str, default 'gvkey'
+            index level identifying the firm
+        date: str, default 'date'
+            index level with the period dates (only used with `period`)
+        period: int, default None
+            months between consecutive observations (12 for FUNDA, 3 for
+            FUNDQ, 1 for MSF). If set, lags that do not land exactly
+            n*period months back (i.e. cross a missing period) are masked.
+
+    """
+
+    def __init__(self, index, group='gvkey', date='date', period=None):
+        self.period = period
+
+        codes = pd.factorize(index.get_level_values(group))[0]
+        self.order = np.argsort(codes, kind='mergesort')
+        self.codes = codes[self.order]
+
+        self.months = None
+        if period:
+            dates = pd.DatetimeIndex(index.get_level_values(date))
+            months = np.asarray(dates.year*12 + dates.month, dtype=float)
+            months[np.asarray(dates.isnull())] = np.nan
+            self.months = months[self.order]
+
+        self._takes = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def take(self, n=1):
+        """Original row positions of the observation n periods back.
+
+        Positions are -1 where the lag crosses a group (or date) boundary.
+        """
+        if n not in self._takes:
+            N = len(self.codes)
+            src = np.arange(N) - n
+            ok = (src >= 0) & (src < N)
+            src[~ok] = 0
+            ok &= (self.codes[src] == self.codes) & (self.codes >= 0)
+            if self.months is not None:
+                ok &= (self.months - self.months[src]) == n*self.period
+
+            take = np.empty(N, dtype=np.intp)
+            take[self.order] = np.where(ok, self.order[src], -1)
+            self._takes[n] = take
+        return self._takes[n]
+
+    def lag(self, x, n=1):
+        """LAG of a Series/DataFrame indexed like this panel."""
+        if len(x) != len(self):
+            raise ValueError('Series length {0} does not match panel index '
+                             'length {1}.'.format(len(x), len(self)))
+        take = self.take(n)
+        values = np.asarray(x.values)
+        if values.dtype.kind in 'biu':
+            values = values.astype(float)
+
+        lagged = values.take(take, axis=0)
+        if values.dtype.kind in 'mM':
+            lagged[take < 0] = np.datetime64('NaT')
+        else:
+            lagged[take < 0] = np.nan
+
+        if isinstance(x, pd.DataFrame):
+            return pd.DataFrame(lagged, index=x.index, columns=x.columns)
+        return pd.Series(lagged, index=x.index, name=x.name)
+
+    def dif(self, x, n=1):
+        """DIF of a Series/DataFrame indexed like this panel."""
+        return x - self.lag(x, n)
+
+    def window(self, n, skip=0):
+        """Sorted positions, and [lo, hi) bounds of each row's window.
+
+        The window of a row covers the n periods ending `skip` periods
+        before it. With `period` set it is measured in calendar months, so
+        missing periods shorten it instead of reaching further back.
+        """
+        if ('window', n, skip) not in self._takes:
+            N = len(self.codes)
+            if self.months is None:
+                order = np.arange(N)
+                lo = np.maximum(order - skip - n + 1, self._starts())
+                hi = np.maximum(order - skip + 1, lo)
+            else:
+                # within each group, order rows by date
+                order = np.lexsort((self.months, self.codes))
+                months = self.months[order]
+                valid = ~np.isnan(months)
+                # missing dates sort last in their group: give them the
+                # largest month so the packed key stays sorted
+                key = self.codes[order].astype(np.int64)*2**20 + \
+                    np.where(valid, months, 2**20 - 1).astype(np.int64)
+                lo = np.searchsorted(key, key - (skip+n-1)*self.period, 'left')
+                hi = np.searchsorted(key, key - skip*self.period, 'right')
+                lo[~valid] = hi[~valid] = 0
+            self._takes[('window', n, skip)] = (order, lo, hi)
+        return self._takes[('window', n, skip)]
+
+    def _starts(self):
+        # sorted position of the first row of each row's group
+        first = np.r_[True, self.codes[1:] != self.codes[:-1]]
+        return np.maximum.accumulate(np.where(first, np.arange(len(first)), 0))
+
+    def rolling_sum(self, x, n, skip=0, min_obs=None):
+        """Sum of x over each row's window (see `window`).
+
+        Windows with fewer than min_obs (default n) non-missing values are
+        NaN. Computed from one cumulative sum, without per-group loops; a
+        DataFrame is summed column by column in the same pass.
+        """
+        if len(x) != len(self):
+            raise ValueError('Series length {0} does not match panel index '
+                             'length {1}.'.format(len(x), len(self)))
+        order, lo, hi = self.window(n, skip)
+        take = self.order[order]
+        values = np.asarray(x.values, dtype=float)
+        values = values.reshape(len(values), -1)[take]
+        valid = ~np.isnan(values)
+        zeros = np.zeros((1, values.shape[1]))
+        sums = np.vstack([zeros, np.cumsum(np.where(valid, values, 0.), 0)])
+        obs = np.vstack([zeros, np.cumsum(valid, 0)])
+
+        result = sums[hi] - sums[lo]
+        result[(obs[hi] - obs[lo]) < (n if min_obs is None else min_obs)] = \
+            np.nan
+        out = np.empty_like(result)
+        out[take] = result
+        if isinstance(x, pd.DataFrame):
+            return pd.DataFrame(out, index=x.index, columns=x.columns)
+        return pd.Series(out[:, 0], index=x.index, name=x.name)
+
+_panels = {}
+_panels_lock = threading.Lock()
+
+def _buffer(values):
+    """The array owning the memory of `values`, and their place in it."""
+    values = np.asarray(values)
+    base = values
+    while isinstance(base.base, np.ndarray):
+        base = base.base
+    return base, (values.__array_interface__['data'][0], values.shape,
+                  values.strides)
+
+def panel_index(index, group='gvkey', date='date', period=None):
+    """PanelIndex of `index`, shared while the index's codes are alive.
+
+    pandas hands out new index objects for a DataFrame's columns and for
+    arithmetic between them, but they all view the same level codes. The
+    cache is keyed on the memory of those codes (checked against the levels
+    and names), so repeated LAG/DIF calls on them sort the panel once and
+    reuse each lag's positions.
+    """
+    if isinstance(index, pd.MultiIndex):
+        arrays, levels = list(index.codes), list(index.levels)
+    else:
+        arrays, levels = [index], []
+    buffers = [_buffer(a) for a in arrays]
+    key = (tuple((id(base), where) for base, where in buffers),
+           tuple(index.names), group, date if period else None, period)
+    with _panels_lock:
+        entry = _panels.get(key)
+        if (entry is not None and
+                all(ref() is base for ref, (base, _) in zip(entry[0],
+                                                            buffers)) and
+                all(a.equals(b) for a, b in zip(entry[1], levels))):
+            return entry[2]
+
+    panel = PanelIndex(index, group, date, period)
+
+    def forget(ref):
+        with _panels_lock:
+            if ref in _panels.get(key, ((),))[0]:
+                del _panels[key]
+
+    refs = tuple(weakref.ref(base, forget) for base, _ in buffers)
+    with _panels_lock:
+        _panels[key] = (refs, levels, panel)
+    return panel
+
+def LAG(x, n=1, group='gvkey', date='date', period=None):
+    return panel_index(x.index, group, date, period).lag(x, n)
+
+def DIF(x, n=1, group='gvkey', date='date', period=None):
+    return panel_index(x.index, group, date, period).dif(x, n)
+
+def rolling_ols(y, X, window, min_obs=None, group='permno', date='date'):
+    """Rolling OLS of y on X (plus an intercept) for every row of a panel.
+
+    Each row's regression uses the `window` rows ending at it within its
+    group, so rows must be ordered by date within each group. The sums of
+    cross-products for all windows come from cumulative sums, and the normal
+    equations are solved in one batched call.
+
+        Parameters
+        ----------
+        y: Series indexed by (group, date), e.g. daily returns
+        X: DataFrame or Series of regressors, indexed like y or by date
+            (e.g. market or factor returns, in the units of y)
+        window: rows (e.g. trading days) per regression
+        min_obs: complete observations required (default: window)
+
+        Returns
+        -------
+        DataFrame indexed like y with alpha, beta_<regressor>, the residual
+        standard deviation (ivol) and the number of observations (n)
+
+    """
+    if isinstance(X, pd.Series):
+        X = X.to_frame()
+    names = list(X.columns)
+    if not isinstance(X.index, pd.MultiIndex):
+        X = X.reindex(y.index.get_level_values(date))
+
+    Z = np.column_stack([np.ones(len(y)), np.asarray(X.values, dtype=float)])
+    yv = np.asarray(y.values, dtype=float)
+    ok = ~np.isnan(yv) & ~np.isnan(Z).any(axis=1)
+    Z[~ok] = 0.
+    yv = np.where(ok, yv, 0.)
+    p = Z.shape[1]
+
+    # one column per distinct cross-product: Z'Z (upper triangle), Z'y, y'y
+    iu = np.triu_indices(p)
+    cross = np.column_stack([Z[:, iu[0]]*Z[:, iu[1]], Z*yv[:, None],
+                             yv*yv, ok])
+    sums = PanelIndex(y.index, group).rolling_sum(
+        pd.DataFrame(cross, index=y.index), window, 0, 0).values
+
+    m = len(iu[0])
+    n = sums[:, -1]
+    good = n >= max(min_obs or window, p + 1)
+
+    A = np.zeros((good.sum(), p, p))
+    A[:, iu[0], iu[1]] = sums[good, :m]
+    A[:, iu[1], iu[0]] = sums[good, :m]
+    b = sums[good, m:m+p]
+    try:
+        coef = np.linalg.solve(A, b[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:
+        # a singular window (e.g. constant regressor): least-squares solution
+        coef = np.einsum('nij,nj->ni', np.linalg.pinv(A), b)
+
+    beta = np.full((len(y), p), np.nan)
+    beta[good] = coef
+    ssr = np.full(len(y), np.nan)
+    ssr[good] = sums[good, m+p] - (coef*b).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ivol = np.sqrt(np.maximum(ssr, 0)/(n - p))
 
-def DIF(x, n=1, group='gvkey'):
-    grp = x.groupby(level=group)
-    return grp.apply(lambda x: x - x.shift(n))
+    out = pd.DataFrame(beta, index=y.index,
+                       columns=['alpha'] + ['beta_{0}'.format(c) for c in names])
+    out['ivol'] = ivol
+    out['n'] = n.astype(int)
+    return out
 
 def COALESCE(x, varlist):
     if not varlist: